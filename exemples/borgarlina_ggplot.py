@@ -28,22 +28,27 @@ dwellings = pd.read_csv("ibudir.csv")
 lina1 = lina1.to_crs(epsg=4326)
 smallarea = smallarea.to_crs(epsg=4326)
 
+# Simplify the small-area outlines; vertices under ~10 m apart are invisible in these plots
+smallarea['geometry'] = smallarea.geometry.simplify(0.0001, preserve_topology=True)
+
 # Data processing
 pop['smasvaedi'] = pop['smasvaedi'].astype(str).str.zfill(4)
 pop2024 = pop[(pop['ar'] == 2024) & (pop['aldursflokkur'] == "10-14 ára") & (pop['kyn'] == 1)]
 all_dwellings = dwellings[dwellings['framvinda'] == "Fullbúið"].groupby('smasvaedi')['Fjöldi'].sum().reset_index()
-pop2024_smallarea = pd.merge(smallarea, pop2024, left_on='smsv', right_on='smasvaedi', how='left')
-all_dwellings_smallarea = pd.merge(smallarea, all_dwellings, left_on='fid', right_on='smasvaedi', how='left')
+# Only the capital region (nuts3 001) is plotted, so merge just those areas
+capital_smallarea = smallarea[smallarea['nuts3'] == "001"]
+pop2024_smallarea = pd.merge(capital_smallarea, pop2024, left_on='smsv', right_on='smasvaedi', how='left')
+all_dwellings_smallarea = pd.merge(capital_smallarea, all_dwellings, left_on='fid', right_on='smasvaedi', how='left')
 
 # Create maps
 fig, ax = plt.subplots(1, 1, figsize=(10, 10)) # Adjust figsize as needed
-pop2024_smallarea[pop2024_smallarea['nuts3'] == "001"].plot(column='fjoldi', ax=ax, legend=True, cmap='viridis') # Customize cmap
+pop2024_smallarea.plot(column='fjoldi', ax=ax, legend=True, cmap='viridis', rasterized=True) # Customize cmap
 lina1.plot(ax=ax, facecolor='none', edgecolor='black')
 ax.set_title("Population Map") # Add title
 plt.show()
 
 fig, ax = plt.subplots(1, 1, figsize=(10, 10))
-all_dwellings_smallarea[all_dwellings_smallarea['nuts3'] == "001"].plot(column='Fjöldi', ax=ax, legend=True, cmap='viridis')
+all_dwellings_smallarea.plot(column='Fjöldi', ax=ax, legend=True, cmap='viridis', rasterized=True)
 lina1.plot(ax=ax, facecolor='none', edgecolor='black')
 ax.set_title("Dwellings Map")
 
@@ -1,21 +1,10 @@
-import geopandas as gpd
 import folium
 from folium import GeoJson
-import json
 import os
 import pandas as pd
 import branca.colormap as cm
 import numpy as np
-
-def extract_zone_code(label):
-    """Extract the numeric code from the end of the zone label."""
-    try:
-        # Extract the last 4 digits from the label
-        code = label.strip().split('-')[-1].strip()
-        # Remove leading zeros and return
-        return str(int(code))
-    except:
-        return None
+from map_data import colormap_fill, extract_zone_codes, load_zones, simplify_for_zoom, to_feature_collection
 
 def create_population_map():
     # Get the absolute path
@@ -27,15 +16,17 @@ def create_population_map():
     population_path = os.path.join(parent_dir, 'data/processed/habitants', 'summarized_population_2023.csv')
     
     try:
-        # Read GeoJSON with UTF-8 encoding
-        with open(geojson_path, 'r', encoding='utf-8') as f:
-            geojson_data = json.load(f)
-            
-        # Convert to GeoDataFrame
-        gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
+        # Read the zones in WGS84, from the Parquet cache when it is up to date
+        gdf = load_zones(geojson_path, columns=['smsv_label'])
         
         # Read population data
-        population_df = pd.read_csv(population_path, encoding='utf-8')
+        population_df = pd.read_csv(
+            population_path,
+            encoding='utf-8',
+            engine='pyarrow',
+            usecols=['ar', 'smasvaedi', 'fjoldi'],
+            dtype={'ar': 'int32', 'smasvaedi': 'int32', 'fjoldi': 'int32'}
+        )
         
         # Process population data:
         # 1. Get the most recent year
@@ -43,14 +34,13 @@ def create_population_map():
         print(f"Processing data for year: {max_year}")
         
         # 2. Filter for most recent year
-        recent_pop = population_df[population_df['ar'] == max_year]
+        recent_pop = population_df.loc[population_df['ar'].to_numpy() == max_year, ['smasvaedi', 'fjoldi']]
         
         # 3. Group by zone (smasvaedi) and sum population (fjoldi)
-        zone_population = recent_pop.groupby('smasvaedi')['fjoldi'].sum().reset_index()
-        zone_population['smasvaedi'] = zone_population['smasvaedi'].astype(str)
+        zone_population = recent_pop.groupby('smasvaedi', sort=False)['fjoldi'].sum().reset_index()
         
         # Extract numeric codes from GeoJSON labels
-        gdf['zone_code'] = gdf['smsv_label'].apply(extract_zone_code)
+        gdf['zone_code'] = extract_zone_codes(gdf['smsv_label'])
         
         # Print some sample mappings for verification
         print("\nSample zone mappings (first 5):")
@@ -69,17 +59,16 @@ def create_population_map():
         print(f"\nTotal zones: {len(gdf)}")
         print(f"Zones with population data: {len(gdf[gdf['fjoldi'].notna()])}")
         
-        # Set the CRS and convert to WGS84
-        if gdf.crs is None:
-            gdf = gdf.set_crs(epsg=3057, allow_override=True)
-        gdf = gdf.to_crs(epsg=4326)
+        # Drop vertices too close together to see at the starting zoom
+        zoom_start = 11
+        gdf = simplify_for_zoom(gdf, zoom_start)
         
         # Calculate center
         bounds = gdf.total_bounds
         center = [(bounds[1] + bounds[3])/2, (bounds[0] + bounds[2])/2]
         
         # Create the map
-        m = folium.Map(location=center, zoom_start=11)
+        m = folium.Map(location=center, zoom_start=zoom_start)
         
         # Check if we have any valid population data
         valid_values = gdf['fjoldi'].dropna()
@@ -99,13 +88,14 @@ def create_population_map():
             caption=f'Population ({max_year})'
         )
         
+        # Look up each zone's fill colour once instead of per feature at render time
+        gdf['_fill'] = colormap_fill(colormap, gdf['fjoldi'].to_numpy())
+        
         # Create a GeoJson layer with the choropleth
         folium.GeoJson(
-            gdf.to_json(),
+            to_feature_collection(gdf),
             style_function=lambda feature: {
-                'fillColor': colormap(feature['properties']['fjoldi']) 
-                    if feature['properties'].get('fjoldi') is not None 
-                    else '#CCCCCC',
+                'fillColor': feature['properties']['_fill'],
                 'color': 'black',
                 'weight': 1,
                 'fillOpacity': 0.7
@@ -0,0 +1,38 @@
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+
+# (module, map function, working directory the script expects, output file under the repo root)
+MAPS = [
+    ('small', 'create_zone_map', SRC_DIR, 'output/zone_map.html'),
+    ('alt', 'create_population_map', ROOT_DIR, 'output/population_map.html'),
+    ('combined', 'create_combined_map', ROOT_DIR, 'output/combined_map.html'),
+]
+
+def build_map(module_name, function_name, working_dir, output_path):
+    """Build one map in its own process and save it, returning the saved path"""
+    # Each script resolves some of its data paths relative to its working directory
+    os.chdir(working_dir)
+    module = importlib.import_module(module_name)
+    map_obj = getattr(module, function_name)()
+    
+    output_path = os.path.join(ROOT_DIR, output_path)
+    map_obj.save(output_path)
+    return output_path
+
+def main():
+    # The maps share no state, so build them side by side in separate processes
+    with ProcessPoolExecutor(max_workers=len(MAPS)) as executor:
+        futures = {executor.submit(build_map, *spec): spec[0] for spec in MAPS}
+        
+        for future in as_completed(futures):
+            try:
+                print(f"Map successfully created and saved as '{future.result()}'")
+            except Exception as e:
+                print(f"Failed to create {futures[future]} map: {e}")
+
+if __name__ == "__main__":
+    main()
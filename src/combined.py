@@ -1,81 +1,68 @@
-import geopandas as gpd
 import folium
 from folium import GeoJson
-import json
 import os
 import pandas as pd
 import branca.colormap as cm
 import numpy as np
-from shapely.geometry import Point, LineString
+import orjson
 import folium.plugins
+from branca.element import MacroElement
+from jinja2 import Template
+from map_data import colormap_fill, extract_zone_codes, load_zones, simplify_for_zoom, to_feature_collection
 import straeto
 
-class CircleHoverMarker(folium.CircleMarker):
-    """Custom CircleMarker that shows buffer on hover"""
-    def __init__(self, location, radius, popup, color, buffer_radius=400, **kwargs):
-        super().__init__(location=location, radius=radius, popup=popup, color=color, **kwargs)
-        self.buffer_radius = buffer_radius
-        
-        # Create the buffer circle
-        self.buffer = folium.Circle(
-            location=location,
-            radius=buffer_radius,
-            color='red',
-            fill=True,
-            opacity=0.4,
-            fill_opacity=0.2,
-            weight=1,
-            className=f'buffer-{hash(str(location))}'
-        )
-        
-        # Add hover JavaScript
-        self.hover_js = f"""
-            <script>
-                var circle = document.querySelector('.buffer-{hash(str(location))}');
-                circle.style.display = 'none';
-                var marker = document.querySelector('#{self.get_name()}');
-                marker.addEventListener('mouseover', function() {{
-                    circle.style.display = 'block';
-                }});
-                marker.addEventListener('mouseout', function() {{
-                    circle.style.display = 'none';
-                }});
-            </script>
-        """
-
-def add_borgarlina_lines(map_obj):
+class BufferHoverScript(MacroElement):
+    """Single script that shows a station's buffer while its marker is hovered"""
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_buffers = {{ this.buffers.get_name() }}.getLayers();
+            {{ this.stations.get_name() }}.getLayers().forEach(function(marker, i) {
+                var buffer = {{ this.get_name() }}_buffers[i];
+                marker.on('mouseover', function() {
+                    buffer.setStyle({opacity: 0.4, fillOpacity: 0.2});
+                });
+                marker.on('mouseout', function() {
+                    buffer.setStyle({opacity: 0, fillOpacity: 0});
+                });
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self, stations, buffers):
+        super().__init__()
+        self._name = 'BufferHoverScript'
+        self.stations = stations
+        self.buffers = buffers
+
+def add_borgarlina_lines(map_obj, buffer_radius=400):
     """Add Borgarlína lines and stations with hover buffers to an existing Folium map"""
     try:
         # Read the JSON data
-        with open('data/processed/cityline_2025_4326.geojson', 'r') as f:
-            data = json.load(f)
+        with open('data/processed/cityline_2025_4326.geojson', 'rb') as f:
+            data = orjson.loads(f.read())
 
         # Create lists to store points for each line
         red_line_points = []
         blue_line_points = []
-        stations = []
-
-        # Sort features by line color and store coordinates
-        for feature in data['features']:
-            coords = feature['geometry']['coordinates']
-            if feature['properties']['line'] == 'red':
-                red_line_points.append(coords)
-            else:
-                blue_line_points.append(coords)
-            stations.append({
-                'coords': coords,
-                'name': feature['properties']['name'],
-                'color': feature['properties']['line']
-            })
 
         # Create feature groups
         lines_group = folium.FeatureGroup(name='Borgarlína Lines')
         stations_group = folium.FeatureGroup(name='Borgarlína Stations')
 
+        # Swap every station's [lon, lat] to folium's [lat, lon] in one array operation
+        locations = np.asarray([feature['geometry']['coordinates'] for feature in data['features']])[:, [1, 0]].tolist()
+
+        # Sort the station points by line color
+        for feature, location in zip(data['features'], locations):
+            if feature['properties']['line'] == 'red':
+                red_line_points.append(location)
+            else:
+                blue_line_points.append(location)
+
         # Add red line
         if red_line_points:
             folium.PolyLine(
-                locations=[[p[1], p[0]] for p in red_line_points],
+                locations=red_line_points,
                 color='red',
                 weight=4,
                 opacity=0.8
@@ -84,32 +71,46 @@ def add_borgarlina_lines(map_obj):
         # Add blue line
         if blue_line_points:
             folium.PolyLine(
-                locations=[[p[1], p[0]] for p in blue_line_points],
+                locations=blue_line_points,
                 color='blue',
                 weight=4,
                 opacity=0.8
             ).add_to(lines_group)
 
-        # Add stations with hover buffers
-        for station in stations:
-            marker = CircleHoverMarker(
-                location=[station['coords'][1], station['coords'][0]],
-                radius=6,
-                popup=station['name'],
-                color=station['color'],
-                fill=True,
-                weight=2
-            )
-            marker.add_to(stations_group)
-            marker.buffer.add_to(stations_group)
-            
-            # Add the hover JavaScript to the map
-            map_obj.get_root().header.add_child(folium.Element(marker.hover_js))
+        # Add every station's buffer as one layer, hidden until its marker is
+        # hovered and non-interactive so it never takes the markers' mouse events
+        buffer = folium.Circle(
+            radius=buffer_radius,
+            color='red',
+            fill=True,
+            opacity=0,
+            fill_opacity=0,
+            weight=1
+        )
+        buffer.options['interactive'] = False
+        buffers = folium.GeoJson(data, name='Borgarlína Buffers', marker=buffer)
+        buffers.add_to(stations_group)
+
+        # Add every station marker as one layer on top of the buffers
+        stations = folium.GeoJson(
+            data,
+            name='Borgarlína Stations',
+            marker=folium.CircleMarker(radius=6, fill=True, weight=2),
+            style_function=lambda feature: {
+                'color': feature['properties']['line'],
+                'fillColor': feature['properties']['line']
+            },
+            popup=folium.GeoJsonPopup(fields=['name'], labels=False)
+        )
+        stations.add_to(stations_group)
 
         # Add groups to map in correct order
         lines_group.add_to(map_obj)
         stations_group.add_to(map_obj)
 
+        # Bind the buffer hover for every station once both layers exist
+        BufferHoverScript(stations, buffers).add_to(map_obj)
+
         return map_obj
     except Exception as e:
         print(f"Error adding Borgarlína lines: {e}")
@@ -124,21 +125,22 @@ def create_combined_map():
         population_path = os.path.join(parent_dir, 'data/processed/habitants', 'summarized_population_2023.csv')
         
         # Read data files
-        with open(geojson_path, 'r', encoding='utf-8') as f:
-            geojson_data = json.load(f)
-                
-        # Convert to GeoDataFrame
-        gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
-        population_df = pd.read_csv(population_path, encoding='utf-8')
+        gdf = load_zones(geojson_path, columns=['smsv_label'])
+        population_df = pd.read_csv(
+            population_path,
+            encoding='utf-8',
+            engine='pyarrow',
+            usecols=['ar', 'smasvaedi', 'fjoldi'],
+            dtype={'ar': 'int32', 'smasvaedi': 'int32', 'fjoldi': 'int32'}
+        )
         
         # Process population data
         max_year = population_df['ar'].max()
-        recent_pop = population_df[population_df['ar'] == max_year]
-        zone_population = recent_pop.groupby('smasvaedi')['fjoldi'].sum().reset_index()
-        zone_population['smasvaedi'] = zone_population['smasvaedi'].astype(str)
+        recent_pop = population_df.loc[population_df['ar'].to_numpy() == max_year, ['smasvaedi', 'fjoldi']]
+        zone_population = recent_pop.groupby('smasvaedi', sort=False)['fjoldi'].sum().reset_index()
         
         # Extract codes and merge data
-        gdf['zone_code'] = gdf['smsv_label'].apply(lambda x: str(int(x.strip().split('-')[-1].strip())))
+        gdf['zone_code'] = extract_zone_codes(gdf['smsv_label'])
         gdf = gdf.merge(
             zone_population,
             how='left',
@@ -146,17 +148,16 @@ def create_combined_map():
             right_on='smasvaedi'
         )
         
-        # Set CRS and convert to WGS84
-        if gdf.crs is None:
-            gdf = gdf.set_crs(epsg=3057, allow_override=True)
-        gdf = gdf.to_crs(epsg=4326)
+        # Drop vertices too close together to see at the starting zoom
+        zoom_start = 11
+        gdf = simplify_for_zoom(gdf, zoom_start)
         
         # Calculate map center
         bounds = gdf.total_bounds
         center = [(bounds[1] + bounds[3])/2, (bounds[0] + bounds[2])/2]
         
         # Create base map
-        m = folium.Map(location=center, zoom_start=11)
+        m = folium.Map(location=center, zoom_start=zoom_start)
         
         # Create population choropleth layer
         valid_values = gdf['fjoldi'].dropna()
@@ -171,17 +172,18 @@ def create_combined_map():
             caption=f'Population ({max_year})'
         )
         
+        # Look up each zone's fill colour once instead of per feature at render time
+        gdf['_fill'] = colormap_fill(colormap, gdf['fjoldi'].to_numpy())
+        
         # Create a feature group for the smasvaedi layer
         smasvaedi_layer = folium.FeatureGroup(name='Smásvæði (Small Areas)', show=True)
         
         # Add GeoJson to the feature group with improved styling
         folium.GeoJson(
-            gdf.to_json(),
+            to_feature_collection(gdf),
             name='Smásvæði',
             style_function=lambda feature: {
-                'fillColor': colormap(feature['properties']['fjoldi']) 
-                    if feature['properties'].get('fjoldi') is not None 
-                    else '#CCCCCC',
+                'fillColor': feature['properties']['_fill'],
                 'color': 'black',
                 'weight': 1,
                 'fillOpacity': 0.7
@@ -54,6 +54,8 @@ class LayerControls:
                     800: '800m',
                     1000: '1000m'
                 },
+                # Only report the value on release so a drag triggers one map rebuild
+                updatemode='mouseup',
                 tooltip={'placement': 'bottom', 'always_visible': True},
                 persistence=True
             )
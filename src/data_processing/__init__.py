@@ -1 +1,10 @@
 # This file makes the data_processing directory a Python package
+import logging
+import os
+
+# The modules in this package log their progress with logger.debug, which the
+# default WARNING root level hides; set DATATON_DEBUG to show it
+if os.environ.get('DATATON_DEBUG'):
+    _logger = logging.getLogger(__name__)
+    _logger.setLevel(logging.DEBUG)
+    _logger.addHandler(logging.StreamHandler())
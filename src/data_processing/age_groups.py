@@ -1,55 +1,56 @@
-import pandas as pd
-import os
+import numpy as np
+from .data_loader import DataLoader
 from .station_coverage import calculate_station_coverage
 
-def calculate_age_group_percentages(station_coords, radius_meters, small_areas):
+# Shared loader so the population table is read and pivoted once per process
+_data_loader = DataLoader()
+
+def _within_radius_age(pop_matrix, coverage):
+    """Weight an (areas x age groups) population matrix by each area's coverage fraction"""
+    # One BLAS matrix-vector product over contiguous float64 arrays; with no
+    # covered areas this is a product over an empty axis and gives zeros
+    pop_matrix = np.ascontiguousarray(pop_matrix, dtype=np.float64)
+    coverage = np.ascontiguousarray(coverage, dtype=np.float64)
+    return pop_matrix.T @ coverage
+
+def calculate_age_group_percentages(station_coords, radius_meters, small_areas, data_loader=None, covered_areas=None):
     """
     Calculate population statistics for specific age groups affected by a station's radius.
     
     Args:
         station_coords (tuple): Station coordinates (lon, lat)
         radius_meters (float): Coverage radius in meters
-        small_areas (list): List of small area geometries with their coordinates
+        small_areas (GeoSeries or list): Area geometries indexed by area id, or small area dicts
+        data_loader (DataLoader, optional): Loader holding the cached population data
+        covered_areas (list, optional): Output of calculate_station_coverage for these areas, if already computed
         
     Returns:
         dict: Population statistics for each age group
     """
     try:
-        # Get covered areas and their percentages
-        covered_areas = calculate_station_coverage(small_areas, station_coords, radius_meters)
+        # Get covered areas and their percentages, unless the caller already has them
+        if covered_areas is None:
+            covered_areas = calculate_station_coverage(small_areas, station_coords, radius_meters)
         
-        # Read population data for 2024
-        population_path = os.path.join('data', 'processed', 'habitants', 'habitant_2024.csv')
-        population_df = pd.read_csv(population_path, encoding='utf-8')
+        # Population for 2024 summed per area and age group, built once by the loader
+        population_pivot = (data_loader or _data_loader).load_population_pivot()
         
         # Define age groups we're interested in
         target_age_groups = ['10-14 ára', '15-19 ára', '20-24 ára']
         
-        # Initialize results dictionary
-        result = {age_group: {'total': 0, 'within_radius': 0} for age_group in target_age_groups}
-        
         # Calculate total population for each age group (across all areas)
-        for age_group in target_age_groups:
-            # Sum fjoldi for this age group across all areas and both genders
-            total = population_df[population_df['aldursflokkur'] == age_group]['fjoldi'].sum()
-            result[age_group]['total'] = total
+        totals = population_pivot.reindex(columns=target_age_groups, fill_value=0).sum(axis=0)
         
-        # Calculate population within radius for each age group
-        for area in covered_areas:
-            area_id = area['id']
-            coverage_percent = area['area_coverage_percent'] / 100  # Convert percentage to decimal
-            
-            # Filter population data for this specific area
-            area_pop = population_df[population_df['smasvaedi'].astype(str) == str(area_id)]
-            
-            # Calculate affected population for each age group
-            for age_group in target_age_groups:
-                # Sum fjoldi for this age group in this area (both genders)
-                age_pop = area_pop[area_pop['aldursflokkur'] == age_group]['fjoldi'].sum()
-                # Multiply by coverage percentage to get population within radius
-                result[age_group]['within_radius'] += age_pop * coverage_percent
+        # Weight each covered area's age groups by its coverage in one matrix product
+        area_ids = [str(area['id']) for area in covered_areas]
+        coverage = np.array([area['area_coverage_percent'] / 100 for area in covered_areas], dtype=np.float64)  # Convert percentage to decimal
+        area_pop = population_pivot.reindex(index=area_ids, columns=target_age_groups, fill_value=0)
+        within_radius = _within_radius_age(area_pop.to_numpy(), coverage)
         
-        return result
+        return {
+            age_group: {'total': totals[age_group], 'within_radius': within_radius[i]}
+            for i, age_group in enumerate(target_age_groups)
+        }
         
     except Exception as e:
         print(f"Error calculating age group statistics: {e}")
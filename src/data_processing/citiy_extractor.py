@@ -1,32 +1,63 @@
-import json
+import os
+import re
+
+import ijson
+import orjson
 
 def extract_locations(json_file_path, search_terms):
-    # Read the JSON file
-    with open(json_file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    """Stream the features of a FeatureCollection, yielding those whose properties match a search term"""
+    # An empty alternation would match every value, so no terms means no matches
+    if not search_terms:
+        return
     
-    # List to store matching features
-    matching_features = []
+    # Compile the terms into one alternation so each value is scanned once
+    pattern = re.compile('|'.join(map(re.escape, search_terms)))
     
-    # Iterate through features
-    for feature in data['features']:
-        # Get properties dictionary
-        props = feature['properties']
-        
-        # Check all property values for any of the search terms
-        for value in props.values():
-            if isinstance(value, str) and any(term in value for term in search_terms):
+    # Open in binary so ijson can parse the file incrementally instead of loading it all
+    with open(json_file_path, 'rb') as file:
+        for feature in ijson.items(file, 'features.item', use_float=True):
+            # Get properties dictionary
+            props = feature['properties']
+            
+            # Check all property values for any of the search terms
+            if any(isinstance(value, str) and pattern.search(value) for value in props.values()):
                 # Keep the entire feature structure
-                matching_features.append(feature)
-                break  # Once we find a match in this feature, move to next feature
-    
-    # Create the same structure as input JSON but with filtered features
-    output_json = {
-        "type": "FeatureCollection",
-        "features": matching_features
-    }
-    
-    return output_json
+                yield feature
+
+def _round_coordinates(coords, ndigits):
+    """Round a (possibly nested) GeoJSON coordinate array"""
+    if coords and isinstance(coords[0], list):
+        return [_round_coordinates(c, ndigits) for c in coords]
+    return [round(v, ndigits) for v in coords]
+
+def round_geometries(features, ndigits):
+    """Round each feature's geometry coordinates to ndigits decimals, yielding the features"""
+    for feature in features:
+        geometry = feature['geometry']
+        geometry['coordinates'] = _round_coordinates(geometry['coordinates'], ndigits)
+        yield feature
+
+def write_feature_collection(features, output_json_path):
+    """Write features one at a time as a single FeatureCollection, returning how many were written"""
+    # Stream into a temporary file and only replace the output once every
+    # feature is written, so a failed read never leaves a truncated file
+    tmp_path = f'{output_json_path}.{os.getpid()}.tmp'
+    count = 0
+    try:
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(b'{"type":"FeatureCollection","features":[\n')
+            for feature in features:
+                if count:
+                    outfile.write(b',\n')
+                outfile.write(orjson.dumps(feature))
+                count += 1
+            outfile.write(b'\n]}\n')
+        os.replace(tmp_path, output_json_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
 
 def main():
     # Define search terms
@@ -37,22 +68,23 @@ def main():
     output_json_path = "data/processed/geo/capital.json"
     
     try:
-        # Extract matching entries
-        filtered_data = extract_locations(input_json_path, search_terms)
-        
-        # Write to new JSON file
-        with open(output_json_path, 'w', encoding='utf-8') as outfile:
-            json.dump(filtered_data, outfile, ensure_ascii=False, indent=2)
+        # Extract matching entries and stream them straight to the new JSON file.
+        # The coordinates are ISN93 metres, so 2 decimals (1 cm) is far below
+        # anything the maps can show and trims every number downstream scripts parse
+        count = write_feature_collection(
+            round_geometries(extract_locations(input_json_path, search_terms), ndigits=2),
+            output_json_path
+        )
             
         print(f"\nSuccessfully created {output_json_path}")
-        print(f"Found {len(filtered_data['features'])} matching entries")
+        print(f"Found {count} matching entries")
             
     except FileNotFoundError:
         print("Error: Input JSON file not found.")
-    except json.JSONDecodeError:
+    except ijson.JSONError:
         print("Error: Invalid JSON format.")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -8,7 +8,7 @@ def clean_habitants_data():
    output_file = os.path.join(output_dir, 'habitant_2023.csv')
 
    # Read CSV
-   df = pd.read_csv(input_path)
+   df = pd.read_csv(input_path, engine='pyarrow')
    
    # Filter for year 2024
    df_2023 = df[df['ar'] == 2023]
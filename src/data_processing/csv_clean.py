@@ -1,5 +1,5 @@
-import pandas as pd
-import os
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 from pathlib import Path
 
 def get_project_root():
@@ -29,80 +29,50 @@ def ensure_output_dirs():
     (PROCESSED_DATA_DIR / "work").mkdir(parents=True, exist_ok=True)
     (PROCESSED_DATA_DIR / "habitants").mkdir(parents=True, exist_ok=True)
 
-def read_and_print_sample(file_path):
-    """Read a CSV file and print first few rows to understand its structure."""
-    print(f"\nReading file: {file_path}")
-    df = pd.read_csv(file_path)
-    print("\nColumns:", df.columns.tolist())
-    print("\nFirst few rows:")
-    print(df.head())
-    return df
-
-def clean_habitants_data():
-    """Clean the employed people data from habitants directory."""
-    input_path = RAW_DATA_DIR / "habitants" / "fjoldi_starfandi.csv"
-    
-    print(f"\nReading habitants data from: {input_path}")
+def clean_csv(input_path, output_path, year=2023):
+    """Keep one year of a CSV file, normalise its column names and drop duplicate rows."""
+    print(f"\nReading data from: {input_path}")
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
     
-    # Read and display sample of the data to understand structure
-    df = read_and_print_sample(input_path)
+    # Open the file as a dataset so the year filter is applied while each batch is decoded
+    dataset = ds.dataset(input_path, format='csv')
+    print("\nColumns:", dataset.schema.names)
     
-    # Filter for 2023 data (we'll confirm the actual year column name from the output)
-    year_col = [col for col in df.columns if 'year' in col.lower() or 'ar' in col.lower()]
+    # Filter for the given year (the year column is found by name)
+    year_col = [col for col in dataset.schema.names if 'year' in col.lower() or 'ar' in col.lower()]
     if year_col:
         print(f"\nFound year column: {year_col[0]}")
-        df_2023 = df[df[year_col[0]] == 2023].copy()
+        df_year = dataset.to_table(filter=pc.field(year_col[0]) == year).to_pandas()
     else:
         print("\nWarning: No year column found. Processing all data.")
-        df_2023 = df.copy()
+        df_year = dataset.to_table().to_pandas()
     
     # Clean column names (remove spaces, lowercase)
-    df_2023.columns = df_2023.columns.str.strip().str.lower().str.replace(' ', '_')
+    df_year.columns = df_year.columns.str.strip().str.lower().str.replace(' ', '_')
     
     # Remove any duplicate entries
-    df_2023 = df_2023.drop_duplicates()
+    df_year = df_year.drop_duplicates()
     
     # Save the cleaned data
-    output_path = PROCESSED_DATA_DIR / "habitants" / "employed_2023.csv"
-    df_2023.to_csv(output_path, index=False)
-    print(f"\nSaved cleaned habitants data to {output_path}")
+    df_year.to_csv(output_path, index=False)
+    print(f"\nSaved cleaned data to {output_path}")
     
-    return df_2023
+    return df_year
+
+def clean_habitants_data():
+    """Clean the employed people data from habitants directory."""
+    return clean_csv(
+        RAW_DATA_DIR / "habitants" / "fjoldi_starfandi.csv",
+        PROCESSED_DATA_DIR / "habitants" / "employed_2023.csv"
+    )
 
 def clean_work_data():
     """Clean the data from work directory."""
-    input_path = RAW_DATA_DIR / "work" / "fjoldi_starfandi.csv"
-    
-    print(f"\nReading work data from: {input_path}")
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
-    
-    # Read and display sample of the data to understand structure
-    df = read_and_print_sample(input_path)
-    
-    # Filter for 2023 data (we'll confirm the actual year column name from the output)
-    year_col = [col for col in df.columns if 'year' in col.lower() or 'ar' in col.lower()]
-    if year_col:
-        print(f"\nFound year column: {year_col[0]}")
-        df_2023 = df[df[year_col[0]] == 2023].copy()
-    else:
-        print("\nWarning: No year column found. Processing all data.")
-        df_2023 = df.copy()
-    
-    # Clean column names (remove spaces, lowercase)
-    df_2023.columns = df_2023.columns.str.strip().str.lower().str.replace(' ', '_')
-    
-    # Remove any duplicate entries
-    df_2023 = df_2023.drop_duplicates()
-    
-    # Save the cleaned data
-    output_path = PROCESSED_DATA_DIR / "work" / "employed_2023.csv"
-    df_2023.to_csv(output_path, index=False)
-    print(f"\nSaved cleaned work data to {output_path}")
-    
-    return df_2023
+    return clean_csv(
+        RAW_DATA_DIR / "work" / "fjoldi_starfandi.csv",
+        PROCESSED_DATA_DIR / "work" / "employed_2023.csv"
+    )
 
 def main():
     """Main function to execute the data cleaning pipeline."""
@@ -1,22 +1,48 @@
 import pandas as pd
 import geopandas as gpd
 import os
+import logging
 from pathlib import Path
-import fiona
-from shapely.geometry import shape, Point, Polygon
+import pyogrio
+from shapely.geometry import Point
 from functools import lru_cache
-from geopy.distance import geodesic
 import numpy as np
+import shapely
+from .station_coverage import create_geodesic_buffer, _TO_ISN93
+
+logger = logging.getLogger(__name__)
+
+# Step of the radius slider in meters; radii are snapped to it before caching
+RADIUS_STEP = 50
 
 class DataLoader:
     def __init__(self):
         self.base_path = Path(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
         self.processed_path = self.base_path / 'data' / 'processed'
+        # Parsed copies of the source files are kept here between runs
+        self.cache_path = self.base_path / 'data' / 'cache'
         # Cache for loaded data
         self._population_data = None
+        self._population_pivot = None
         self._small_areas = None
-        self._affected_areas_cache = {}
+        self._small_areas_tree = None
+        self._affected_areas_cache = lru_cache(maxsize=128)(self._cached_areas_within_radius)
         self._schools_data = None
+        self._cityline_data = {}
+
+    def _is_cache_fresh(self, cache_file, source_file):
+        """Check that a cache file exists and was written after its source file"""
+        return cache_file.exists() and cache_file.stat().st_mtime >= source_file.stat().st_mtime
+
+    def _write_cache(self, df, cache_file):
+        """Write a frame to a Parquet cache file, going through a temporary file"""
+        try:
+            self.cache_path.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+            df.to_parquet(tmp_file, compression='zstd')
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            print(f"Error writing cache {cache_file}: {e}")
 
     def load_schools_data(self, force=False):
         """Load schools data with caching"""
@@ -29,10 +55,12 @@ class DataLoader:
                 raise FileNotFoundError(f"Schools data not found at {file_path}")
             
             # Read CSV with latin1 encoding for Icelandic characters
-            df = pd.read_csv(str(file_path), encoding='latin1')
+            df = pd.read_csv(str(file_path), encoding='latin1', engine='pyarrow')
+            # float32 still resolves the coordinates to well under a meter
+            df[['Location Lng', 'Location Lat']] = df[['Location Lng', 'Location Lat']].astype('float32')
             self._schools_data = gpd.GeoDataFrame(
                 df,
-                geometry=[Point(xy) for xy in zip(df['Location Lng'], df['Location Lat'])],
+                geometry=shapely.points(df['Location Lng'].to_numpy(), df['Location Lat'].to_numpy()),
                 crs="EPSG:4326"
             )
             return self._schools_data
@@ -40,23 +68,19 @@ class DataLoader:
             print(f"Error loading schools data: {e}")
             return gpd.GeoDataFrame(columns=['Name', 'geometry'], crs="EPSG:4326")
 
-    def load_cityline_data(self, year):
-        """Load cityline GeoJSON data for a specific year"""
+    def load_cityline_data(self, year, force=False):
+        """Load cityline GeoJSON data for a specific year with caching"""
+        if not force and year in self._cityline_data:
+            return self._cityline_data[year]
+
         try:
             file_path = str(self.processed_path / f'cityline_{year}_4326.geojson')
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"Cityline data for year {year} not found at {file_path}")
             
-            # Use fiona to read the file
-            with fiona.open(file_path) as collection:
-                features = list(collection)
-                
-            # Convert to GeoDataFrame
-            geometries = [shape(feature['geometry']) for feature in features]
-            properties = [feature['properties'] for feature in features]
-            
-            gdf = gpd.GeoDataFrame(properties, geometry=geometries, crs="EPSG:4326")
-            return gdf
+            # Read the file with pyogrio, which builds all the geometries in one batch
+            self._cityline_data[year] = gpd.read_file(file_path, engine='pyogrio')
+            return self._cityline_data[year]
             
         except Exception as e:
             print(f"Error loading cityline data: {e}")
@@ -72,56 +96,95 @@ class DataLoader:
             file_path = self.processed_path / 'habitants' / 'habitant_2024.csv'
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"Population data not found at {file_path}")
-            self._population_data = pd.read_csv(str(file_path))
-            # Convert smasvaedi to string to match small areas
-            self._population_data['smasvaedi'] = self._population_data['smasvaedi'].astype(str)
+            
+            # Reuse the Parquet copy while the CSV is unchanged
+            cache_file = self.cache_path / 'habitant_2024.parquet'
+            if self._is_cache_fresh(cache_file, file_path):
+                self._population_data = pd.read_parquet(cache_file)
+            else:
+                self._population_data = pd.read_csv(str(file_path), engine='pyarrow')
+                # Convert smasvaedi to string to match small areas, and store both
+                # key columns as categoricals so filters compare integer codes
+                self._population_data['smasvaedi'] = self._population_data['smasvaedi'].astype(str).astype('category')
+                self._population_data['aldursflokkur'] = self._population_data['aldursflokkur'].astype('category')
+                self._write_cache(self._population_data, cache_file)
+            
+            # Zero-pad the area ids to match the small areas' smsv index ('101' -> '0101');
+            # renaming the categories pads every row at once and also fixes older caches
+            area_ids = self._population_data['smasvaedi'].cat.categories
+            self._population_data['smasvaedi'] = self._population_data['smasvaedi'].cat.rename_categories(area_ids.str.zfill(4))
+            
+            # Counts fit comfortably in int32, which also leaves headroom for per-area sums;
+            # done after the cache read too so older caches match
+            self._population_data['fjoldi'] = self._population_data['fjoldi'].astype('int32')
+            
+            # Sum both genders once into an int32 area x age group table for per-station lookups
+            self._population_pivot = (
+                self._population_data.groupby(['smasvaedi', 'aldursflokkur'], observed=True)['fjoldi']
+                .sum()
+                .unstack(fill_value=0)
+                .astype('int32')
+            )
             return self._population_data
         except Exception as e:
             print(f"Error loading population data: {e}")
             # Return empty DataFrame with expected columns
             return pd.DataFrame(columns=['smasvaedi', 'aldursflokkur', 'fjoldi'])
 
+    def load_population_pivot(self, force=False):
+        """Load population summed per small area (rows) and age group (columns) with caching"""
+        if force or self._population_pivot is None:
+            self.load_population_data(force=True)
+        if self._population_pivot is None:
+            return pd.DataFrame()
+        return self._population_pivot
+
     def load_small_areas(self, force=False):
         """Load small areas GeoJSON data with caching"""
         if not force and self._small_areas is not None:
             return self._small_areas
 
         try:
-            print("\nLOADING SMALL AREAS")
             file_path = str(self.base_path / 'data' / 'smasvaedi_2021.json')
-            print(f"File path: {file_path}")
-            print(f"File exists: {os.path.exists(file_path)}")
-            
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"Small areas data not found at {file_path}")
             
-            # Use fiona to read the file
-            with fiona.open(file_path) as collection:
-                print(f"Collection CRS: {collection.crs}")
-                features = list(collection)
-                print(f"Number of features: {len(features)}")
+            # Reuse the reprojected GeoParquet copy while the GeoJSON is unchanged
+            cache_file = self.cache_path / 'small_areas.parquet'
+            if self._is_cache_fresh(cache_file, Path(file_path)):
+                self._small_areas = gpd.read_parquet(cache_file)
+            else:
+                logger.debug("Loading small areas")
+                logger.debug(f"File path: {file_path}")
                 
-            # Convert to GeoDataFrame with original CRS
-            geometries = [shape(feature['geometry']) for feature in features]
-            properties = [feature['properties'] for feature in features]
-            
-            print("Creating GeoDataFrame...")
-            gdf = gpd.GeoDataFrame(properties, geometry=geometries, crs="EPSG:3057")
-            
-            # Reproject to EPSG:4326
-            print("Reprojecting to EPSG:4326...")
-            self._small_areas = gdf.to_crs("EPSG:4326")
-            
-            print(f"GeoDataFrame shape: {self._small_areas.shape}")
-            print(f"GeoDataFrame columns: {self._small_areas.columns}")
-            print(f"GeoDataFrame CRS: {self._small_areas.crs}")
+                # Read the file straight into a GeoDataFrame in its own CRS (ISN93)
+                gdf = pyogrio.read_dataframe(file_path, use_arrow=True)
+                logger.debug(f"File CRS: {gdf.crs}")
+                logger.debug(f"Number of features: {len(gdf)}")
+                
+                # Reproject to EPSG:4326
+                logger.debug("Reprojecting to EPSG:4326...")
+                self._small_areas = gdf.to_crs("EPSG:4326")
+                
+                logger.debug(f"GeoDataFrame shape: {self._small_areas.shape}")
+                logger.debug(f"GeoDataFrame columns: {self._small_areas.columns}")
+                logger.debug(f"GeoDataFrame CRS: {self._small_areas.crs}")
+                
+                # Convert smsv to string to match population data
+                self._small_areas['smsv'] = self._small_areas['smsv'].astype(str)
+                
+                # Create spatial index for faster intersection queries
+                self._small_areas = self._small_areas.set_index('smsv')
+                self._write_cache(self._small_areas, cache_file)
+                logger.debug("Small areas loaded successfully")
             
-            # Convert smsv to string to match population data
-            self._small_areas['smsv'] = self._small_areas['smsv'].astype(str)
+            # Build the STRtree now so the first station query doesn't pay for it; it
+            # prefilters areas by bounding box before any exact intersection test
+            self._small_areas.sindex
             
-            # Create spatial index for faster intersection queries
-            self._small_areas = self._small_areas.set_index('smsv')
-            print("Small areas loaded successfully")
+            # Index the areas in metric ISN93 too, so radius queries can test the
+            # distance to the station directly instead of intersecting a buffer
+            self._small_areas_tree = shapely.STRtree(self._small_areas.geometry.to_crs(3057).to_numpy())
             return self._small_areas
             
         except Exception as e:
@@ -137,12 +200,10 @@ class DataLoader:
             if not area_ids:
                 return {}
 
-            population_data = self.load_population_data()
-            if area_ids:
-                population_data = population_data[population_data['smasvaedi'].isin(area_ids)]
-            
-            age_groups = population_data.groupby('aldursflokkur')['fjoldi'].sum()
-            return age_groups.to_dict()
+            # Sum the rows of the area x age group table for the areas that have data
+            population_pivot = self.load_population_pivot()
+            area_pop = population_pivot.loc[population_pivot.index.intersection(area_ids)]
+            return area_pop.sum(axis=0).to_dict()
         except Exception as e:
             print(f"Error calculating age distribution: {e}")
             return {}
@@ -153,74 +214,45 @@ class DataLoader:
             if not area_ids:
                 return 0
 
-            population_data = self.load_population_data()
-            if area_ids:
-                population_data = population_data[population_data['smasvaedi'].isin(area_ids)]
-            return population_data['fjoldi'].sum()
+            population_pivot = self.load_population_pivot()
+            area_pop = population_pivot.loc[population_pivot.index.intersection(area_ids)]
+            return area_pop.to_numpy().sum()
         except Exception as e:
             print(f"Error calculating total population: {e}")
             return 0
 
-    def _get_cache_key(self, point, radius):
-        """Generate a cache key for affected areas"""
-        return f"{point.wkt}_{radius}"
-
-    def _create_geodesic_circle(self, center: Point, radius_meters: float, num_points: int = 64) -> Polygon:
-        """
-        Create a circular polygon using geodesic distances.
+    def _query_areas(self, small_areas, point, radius):
+        """Find the small areas intersecting a buffer of radius meters around a point"""
+        # Create a buffer of radius meters in a local azimuthal equidistant projection
+        point_buffer = create_geodesic_buffer(point, radius)
         
-        Args:
-            center (Point): Center point of the circle
-            radius_meters (float): Radius in meters
-            num_points (int): Number of points to use for the circle approximation
-        
-        Returns:
-            Polygon: A circular polygon using geodesic distances
-        """
-        angles = np.linspace(0, 360, num_points)
-        circle_points = []
-        
-        for angle in angles:
-            # Calculate destination point given distance and bearing
-            point = geodesic().destination(
-                point=(center.y, center.x),  # geodesic expects (lat, lon)
-                bearing=angle,
-                distance=radius_meters
-            )
-            circle_points.append((point.longitude, point.latitude))
+        # Find all areas that intersect with the buffer through the spatial index,
+        # keeping them in their original order; iloc with positions already returns a copy
+        idx = np.sort(small_areas.sindex.query(point_buffer, predicate='intersects'))
+        return small_areas.iloc[idx]
+
+    def _cached_areas_within_radius(self, x, y, radius):
+        """Find the loaded small areas within radius of (x, y); wrapped in an lru_cache per instance"""
+        small_areas = self.load_small_areas()
+        if self._small_areas_tree is None:
+            return self._query_areas(small_areas, Point(x, y), radius)
         
-        # Close the polygon
-        circle_points.append(circle_points[0])
-        return Polygon(circle_points)
+        # One distance predicate against the ISN93 index, keeping the original order
+        point = shapely.points(*_TO_ISN93.transform(x, y))
+        idx = np.sort(self._small_areas_tree.query(point, predicate='dwithin', distance=radius))
+        return small_areas.iloc[idx]
 
     def get_areas_within_radius(self, point, radius, small_areas=None):
         """Get all small areas within radius of a point using geodesic distances"""
         try:
-            # Check cache first
-            cache_key = self._get_cache_key(point, radius)
-            if cache_key in self._affected_areas_cache:
-                return self._affected_areas_cache[cache_key]
-
-            if small_areas is None:
-                small_areas = self.load_small_areas()
-            
-            # Create a geodesic buffer around the point
-            point_buffer = self._create_geodesic_circle(point, radius)
-            
-            # Find all areas that intersect with the buffer
-            intersecting_areas = small_areas[small_areas.intersects(point_buffer)].copy()
-            
-            # Cache the result
-            self._affected_areas_cache[cache_key] = intersecting_areas
+            # Snap the radius to the slider step so near-duplicate queries share a cache entry
+            radius = round(radius / RADIUS_STEP) * RADIUS_STEP
             
-            # Limit cache size
-            if len(self._affected_areas_cache) > 100:
-                # Remove oldest entries
-                oldest_keys = list(self._affected_areas_cache.keys())[:50]
-                for key in oldest_keys:
-                    del self._affected_areas_cache[key]
+            # Only the loader's own small areas are cached; any other frame is queried directly
+            if small_areas is not None and small_areas is not self._small_areas:
+                return self._query_areas(small_areas, point, radius)
             
-            return intersecting_areas
+            return self._affected_areas_cache(round(point.x, 6), round(point.y, 6), radius)
         except Exception as e:
             print(f"Error finding areas within radius: {e}")
             return gpd.GeoDataFrame(columns=['geometry', 'smsv'], crs="EPSG:4326")
@@ -255,6 +287,8 @@ class DataLoader:
     def clear_caches(self):
         """Clear all cached data"""
         self._population_data = None
+        self._population_pivot = None
         self._small_areas = None
-        self._affected_areas_cache.clear()
+        self._small_areas_tree = None
+        self._affected_areas_cache.cache_clear()
         self._schools_data = None
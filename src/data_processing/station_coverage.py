@@ -1,9 +1,44 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
+import geopandas as gpd
 from shapely.geometry import Point, shape, Polygon
 from shapely.validation import make_valid
+from shapely.ops import transform as shp_transform
 import pyproj
-from functools import partial
+from functools import lru_cache, partial
 import numpy as np
+import shapely
+
+# WGS84 is the source/target of every local projection below
+_WGS84 = pyproj.CRS('EPSG:4326')
+
+# ISN93 is metric across all of Iceland, so batches of stations share one projection
+_TO_ISN93 = pyproj.Transformer.from_crs(_WGS84, pyproj.CRS('EPSG:3057'), always_xy=True)
+
+@lru_cache(maxsize=512)
+def _get_local_transformers(proj: str, lat_key: float, lon_key: float) -> Tuple[pyproj.Transformer, pyproj.Transformer]:
+    """
+    Build the (to local, back to WGS84) transformers for a projection centred on a point.
+    
+    Cached on the rounded centre, so stations and areas within ~100 m of each
+    other reuse the same pair instead of parsing new PROJ strings.
+    """
+    proj_str = f"+proj={proj} +lat_0={lat_key} +lon_0={lon_key} +x_0=0 +y_0=0 +ellps=WGS84 +units=m +no_defs"
+    local = pyproj.CRS(proj_str)
+    return (
+        pyproj.Transformer.from_crs(_WGS84, local, always_xy=True),
+        pyproj.Transformer.from_crs(local, _WGS84, always_xy=True)
+    )
+
+def get_local_transformers(proj: str, lat: float, lon: float) -> Tuple[pyproj.Transformer, pyproj.Transformer]:
+    """Get the cached transformers for a local projection centred near (lat, lon)"""
+    return _get_local_transformers(proj, round(lat, 3), round(lon, 3))
+
+def project_geometries(geoms, transformer: pyproj.Transformer):
+    """Transform an array of geometries with one batched PROJ call over all their coordinates"""
+    def transform(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+    return shapely.transform(np.asarray(geoms, dtype=object), transform)
 
 def create_geodesic_buffer(center: Point, radius_meters: float) -> Polygon:
     """
@@ -16,71 +51,105 @@ def create_geodesic_buffer(center: Point, radius_meters: float) -> Polygon:
     Returns:
         Polygon: A circular buffer using geodesic distances
     """
-    # Create the projection centered on our point of interest
-    proj_str = f"+proj=aeqd +lat_0={center.y} +lon_0={center.x} +x_0=0 +y_0=0 +ellps=WGS84 +units=m +no_defs"
+    # Get the cached projection transformers centred near our point of interest
+    to_aeqd, from_aeqd = get_local_transformers('aeqd', center.y, center.x)
     
-    # Create projection transformers
-    wgs84 = pyproj.CRS('EPSG:4326')
-    aeqd = pyproj.CRS(proj_str)
-    project = pyproj.Transformer.from_crs(wgs84, aeqd, always_xy=True).transform
-    unproject = pyproj.Transformer.from_crs(aeqd, wgs84, always_xy=True).transform
+    # Create a circle in projected coordinates around the projected center,
+    # which is within ~100 m of the projection origin
+    cx, cy = to_aeqd.transform(center.x, center.y)
+    angles = np.linspace(0, 2*np.pi, 64, endpoint=False)
+    xs = cx + radius_meters*np.cos(angles)
+    ys = cy + radius_meters*np.sin(angles)
     
-    # Create a circle in projected coordinates
-    angles = np.linspace(0, 2*np.pi, 64)
-    circle_points = [(radius_meters*np.cos(θ), radius_meters*np.sin(θ)) for θ in angles]
-    
-    # Convert back to geographic coordinates
-    buffer_points = [unproject(x, y) for x, y in circle_points]
+    # Convert all the points back to geographic coordinates in one call
+    lon, lat = from_aeqd.transform(xs, ys)
     
     # Create and return the polygon
-    return Polygon(buffer_points)
+    return Polygon(np.column_stack([lon, lat]))
 
-def calculate_area_coverage(geom1: Polygon, geom2: Polygon, center_lat: float) -> Tuple[float, float]:
+def calculate_area_coverage(areas_proj, buffer_proj: Polygon) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Calculate the area of intersection and total area using a local projection.
+    Calculate the areas of intersection and total areas of already projected geometries.
     
     Args:
-        geom1 (Polygon): First geometry
-        geom2 (Polygon): Second geometry
-        center_lat (float): Latitude for the local projection
+        areas_proj: Area geometries in a local metric projection
+        buffer_proj (Polygon): Station buffer in the same projection
     
     Returns:
-        Tuple[float, float]: (intersection area, total area) in square meters
+        Tuple[np.ndarray, np.ndarray]: (intersection areas, total areas) in square meters
     """
-    # Create a local projection centered on the area
-    proj_str = f"+proj=laea +lat_0={center_lat} +lon_0={geom1.centroid.x} +x_0=0 +y_0=0 +ellps=WGS84 +units=m +no_defs"
-    
-    # Create projection transformer
-    wgs84 = pyproj.CRS('EPSG:4326')
-    local = pyproj.CRS(proj_str)
-    project = pyproj.Transformer.from_crs(wgs84, local, always_xy=True).transform
-    
-    # Project both geometries
-    geom1_proj = transform_geometry(geom1, project)
-    geom2_proj = transform_geometry(geom2, project)
-    
-    # Calculate areas
-    intersection_area = geom1_proj.intersection(geom2_proj).area
-    total_area = geom1_proj.area
+    areas_proj = np.asarray(areas_proj, dtype=object)
+    intersection_area = shapely.area(shapely.intersection(areas_proj, buffer_proj))
+    total_area = shapely.area(areas_proj)
     
     return intersection_area, total_area
 
 def transform_geometry(geom, project):
-    """Transform a geometry using the given projection function."""
+    """Transform a geometry using the given (array-capable) projection function."""
     if geom.is_empty:
         return geom
     if geom.geom_type == 'Polygon':
         shell = transform_coords(geom.exterior.coords, project)
         holes = [transform_coords(interior.coords, project) for interior in geom.interiors]
         return Polygon(shell, holes)
-    raise ValueError(f"Unsupported geometry type: {geom.geom_type}")
+    # Multi-part and other geometries are handed one coordinate array per part
+    return shp_transform(project, geom)
 
 def transform_coords(coords, project):
-    """Transform a sequence of coordinates using the given projection function."""
-    return [project(x, y) for x, y in coords]
+    """Transform a sequence of coordinates with one call of the given projection function."""
+    coords = np.asarray(coords)
+    x, y = project(coords[:, 0], coords[:, 1])
+    return np.column_stack([x, y])
+
+def collect_area_geometries(small_areas: Union[gpd.GeoSeries, List[Dict]]) -> Tuple[List, List[Polygon]]:
+    """
+    Build the valid area polygons and their ids from the small areas, in input order.
+    
+    Args:
+        small_areas (GeoSeries or List[Dict]): Area geometries indexed by area id,
+            or a list of small area dicts with their coordinates.
+    
+    Returns:
+        Tuple[List, List[Polygon]]: (area ids, area geometries in EPSG:4326)
+    """
+    if isinstance(small_areas, gpd.GeoSeries):
+        # Shapely geometries are used as they are, repairing only the invalid ones
+        small_areas = small_areas[~(small_areas.isna() | small_areas.is_empty)]
+        area_geoms = small_areas.to_numpy()
+        invalid = ~shapely.is_valid(area_geoms)
+        area_geoms[invalid] = shapely.make_valid(area_geoms[invalid])
+        return small_areas.index.astype(str).tolist(), list(area_geoms)
+    
+    area_ids = []
+    area_geoms = []
+    for area in small_areas:
+        try:
+            # Create polygon from coordinates
+            if isinstance(area, str):
+                # If area is a string (area ID), skip it
+                continue
+                
+            coordinates = area.get("geometry") if isinstance(area, dict) else area
+            if not coordinates:
+                continue
+                
+            area_geom = Polygon(coordinates)
+            
+            # Fix invalid geometries if needed
+            if not area_geom.is_valid:
+                area_geom = make_valid(area_geom)
+            
+            area_ids.append(area.get("id") if isinstance(area, dict) else str(area))
+            area_geoms.append(area_geom)
+                
+        except Exception as e:
+            print(f"Error processing area {area if isinstance(area, str) else area.get('id', 'unknown')}: {str(e)}")
+            continue
+    
+    return area_ids, area_geoms
 
 def calculate_station_coverage(
-    small_areas: List[Dict], 
+    small_areas: Union[gpd.GeoSeries, List[Dict]], 
     station_coords: Tuple[float, float], 
     radius_meters: float
 ) -> List[Dict]:
@@ -88,7 +157,7 @@ def calculate_station_coverage(
     Calculate the coverage area of a station within its radius and identify intersecting small areas.
 
     Args:
-        small_areas (List[Dict]): List of small area geometries with their coordinates.
+        small_areas (GeoSeries or List[Dict]): Area geometries indexed by area id, or small area dicts.
         station_coords (Tuple[float, float]): Station coordinates (lon, lat) in EPSG:4326.
         radius_meters (float): Coverage radius in meters.
 
@@ -109,52 +178,35 @@ def calculate_station_coverage(
         else:
             raise ValueError(f"Station coordinates must be a tuple or list, got {type(station_coords)}")
 
-        # Create station buffer
-        station_buffer = create_geodesic_buffer(station_point, radius_meters)
+        # Collect the valid area polygons and their ids in input order
+        area_ids, area_geoms = collect_area_geometries(small_areas)
+        if not area_geoms:
+            return []
         
-        covered_areas = []
-        for area in small_areas:
-            try:
-                # Create polygon from coordinates
-                if isinstance(area, str):
-                    # If area is a string (area ID), skip it
-                    continue
-                    
-                coordinates = area.get("geometry") if isinstance(area, dict) else area
-                if not coordinates:
-                    continue
-                    
-                area_geom = Polygon(coordinates)
-                
-                # Fix invalid geometries if needed
-                if not area_geom.is_valid:
-                    area_geom = make_valid(area_geom)
-                
-                # Check if area intersects with station buffer
-                if area_geom.intersects(station_buffer):
-                    # Calculate areas using proper projection
-                    intersection_area, total_area = calculate_area_coverage(
-                        area_geom,
-                        station_buffer,
-                        station_point.y  # Use station latitude for projection
-                    )
-                    
-                    # Calculate coverage percentage
-                    area_coverage = (intersection_area / total_area) * 100 if total_area > 0 else 0
-                    
-                    area_id = area.get("id") if isinstance(area, dict) else str(area)
-                    covered_areas.append({
-                        "id": area_id,
-                        "area_coverage_percent": area_coverage
-                    })
-                    
-                    print(f"Area {area_id}: {area_coverage:.1f}% coverage")  # Debug print
-                    
-            except Exception as e:
-                print(f"Error processing area {area if isinstance(area, str) else area.get('id', 'unknown')}: {str(e)}")
-                continue
+        # Project every area at once into the cached azimuthal equidistant
+        # projection around the station, where the buffer is a plain circle in meters
+        to_aeqd, _ = get_local_transformers('aeqd', station_point.y, station_point.x)
+        areas_proj = project_geometries(area_geoms, to_aeqd)
+        buffer_proj = Point(to_aeqd.transform(station_point.x, station_point.y)).buffer(radius_meters, quad_segs=16)
         
-        return covered_areas
+        # Use the spatial index to keep only the areas that touch the buffer
+        idx = np.sort(shapely.STRtree(areas_proj).query(buffer_proj, predicate='intersects'))
+        
+        # Calculate intersection and total areas for all candidates in one pass
+        intersection_area, total_area = calculate_area_coverage(areas_proj[idx], buffer_proj)
+        
+        # Calculate coverage percentage
+        area_coverage = np.divide(
+            intersection_area * 100,
+            total_area,
+            out=np.zeros_like(total_area),
+            where=total_area > 0
+        )
+        
+        return [
+            {"id": area_ids[i], "area_coverage_percent": float(coverage)}
+            for i, coverage in zip(idx, area_coverage)
+        ]
         
     except Exception as e:
         print(f"Error in calculate_station_coverage: {str(e)}")
@@ -162,8 +214,67 @@ def calculate_station_coverage(
         traceback.print_exc()
         return []
 
+def calculate_station_coverage_batch(
+    small_areas: Union[gpd.GeoSeries, List[Dict]], 
+    stations: List[Tuple[float, float]], 
+    radius_meters: float
+) -> List[List[Dict]]:
+    """
+    Calculate the covered small areas of several stations in one vectorized pass.
+
+    Every area and station is projected once into ISN93 (EPSG:3057) and all the
+    station buffers are matched against one spatial index, instead of building a
+    local projection, buffer and index per station as calculate_station_coverage does.
+
+    Args:
+        small_areas (GeoSeries or List[Dict]): Area geometries indexed by area id, or small area dicts.
+        stations (List[Tuple[float, float]]): Station coordinates (lon, lat) in EPSG:4326.
+        radius_meters (float): Coverage radius in meters.
+
+    Returns:
+        List[List[Dict]]: For each station, its covered areas with their coverage percentages.
+    """
+    try:
+        area_ids, area_geoms = collect_area_geometries(small_areas)
+        if not area_geoms or not stations:
+            return [[] for _ in stations]
+        
+        areas_proj = project_geometries(area_geoms, _TO_ISN93)
+        
+        # Project the stations with one PROJ call and buffer them all at once
+        lon, lat = np.asarray(stations, dtype=float).T
+        x, y = _TO_ISN93.transform(lon, lat)
+        buffers_proj = shapely.buffer(shapely.points(x, y), radius_meters, quad_segs=16)
+        
+        # Every intersecting (station, area) pair from one spatial index query,
+        # ordered by station and then by the areas' input order
+        station_idx, area_idx = shapely.STRtree(areas_proj).query(buffers_proj, predicate='intersects')
+        order = np.lexsort((area_idx, station_idx))
+        station_idx, area_idx = station_idx[order], area_idx[order]
+        
+        # Calculate the coverage of every pair in one pass
+        intersection_area = shapely.area(shapely.intersection(areas_proj[area_idx], buffers_proj[station_idx]))
+        total_area = shapely.area(areas_proj)[area_idx]
+        area_coverage = np.divide(
+            intersection_area * 100,
+            total_area,
+            out=np.zeros_like(total_area),
+            where=total_area > 0
+        )
+        
+        covered_areas = [[] for _ in stations]
+        for s, i, coverage in zip(station_idx, area_idx, area_coverage):
+            covered_areas[s].append({"id": area_ids[i], "area_coverage_percent": float(coverage)})
+        return covered_areas
+        
+    except Exception as e:
+        print(f"Error in calculate_station_coverage_batch: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return [[] for _ in stations]
+
 def get_affected_areas_string(
-    small_areas: List[Dict], 
+    small_areas: Union[gpd.GeoSeries, List[Dict]], 
     station_coords: Tuple[float, float], 
     radius_meters: float
 ) -> str:
@@ -171,7 +282,7 @@ def get_affected_areas_string(
     Get a formatted string of affected area IDs and their coverage percentages.
 
     Args:
-        small_areas (List[Dict]): List of small area geometries with their coordinates.
+        small_areas (GeoSeries or List[Dict]): Area geometries indexed by area id, or small area dicts.
         station_coords (Tuple[float, float]): Station coordinates (lon, lat) in EPSG:4326.
         radius_meters (float): Coverage radius in meters.
 
@@ -1,80 +1,75 @@
+import logging
 import pandas as pd
 import numpy as np
+import shapely
 from shapely.geometry import Point
 from .data_loader import DataLoader
+from .station_coverage import create_geodesic_buffer
+
+logger = logging.getLogger(__name__)
+
+# Errors from missing or malformed data, which fall back to empty results; anything
+# else is a bug and propagates
+DATA_ERRORS = (KeyError, ValueError, TypeError, shapely.errors.GEOSException)
 
 class Statistics:
-    def __init__(self):
-        self.data_loader = DataLoader()
+    def __init__(self, data_loader=None):
+        # Pass the app's loader to share its cached small areas and population data
+        self.data_loader = data_loader or DataLoader()
 
     def calculate_station_metrics(self, station_coord, radius):
         """Calculate metrics for a given station and radius"""
-        try:
-            stats = self.data_loader.get_station_statistics(station_coord, radius)
-            
-            # Add additional analysis
-            if stats['affected_areas'] > 0:
-                stats['population_density'] = stats['total_population'] / (np.pi * (radius/1000)**2)  # per km²
-            else:
-                stats['population_density'] = 0
-            
-            # Calculate age group percentages
-            total_pop = sum(stats['age_distribution'].values()) if stats['age_distribution'] else 0
-            if total_pop > 0:
-                stats['age_percentages'] = {
-                    age: (count/total_pop)*100 
-                    for age, count in stats['age_distribution'].items()
-                }
-            else:
-                stats['age_percentages'] = {}
-            
-            return stats
-        except Exception as e:
-            print(f"Error in calculate_station_metrics: {e}")
-            return {
-                'total_population': 0,
-                'age_distribution': {},
-                'affected_areas': 0,
-                'population_density': 0,
-                'age_percentages': {}
-            }
+        # get_station_statistics already falls back to empty statistics on errors
+        stats = self.data_loader.get_station_statistics(station_coord, radius)
+        
+        # Add additional analysis
+        if stats['affected_areas'] > 0:
+            stats['population_density'] = stats['total_population'] / (np.pi * (radius/1000)**2)  # per km²
+        else:
+            stats['population_density'] = 0
+        
+        # Calculate age group percentages with one scaled division over all counts
+        counts = np.fromiter(stats['age_distribution'].values(), dtype=np.float64, count=len(stats['age_distribution']))
+        total_pop = counts.sum()
+        if total_pop > 0:
+            stats['age_percentages'] = dict(zip(stats['age_distribution'].keys(), (counts * (100.0 / total_pop)).tolist()))
+        else:
+            stats['age_percentages'] = {}
+        
+        return stats
 
     def calculate_line_metrics(self, line_coords, radius):
         """Calculate metrics for an entire line"""
         try:
-            total_stats = {
-                'total_population': 0,
-                'age_distribution': {},
-                'affected_areas': set(),
-                'total_coverage': 0
-            }
+            if not line_coords:
+                return {
+                    'total_population': 0,
+                    'age_distribution': {},
+                    'affected_areas': [],
+                    'total_coverage': 0
+                }
             
-            # Calculate metrics for each station
-            for coord in line_coords:
-                station_stats = self.data_loader.get_station_statistics(coord, radius)
-                
-                # Aggregate statistics
-                total_stats['total_population'] += station_stats['total_population']
-                
-                # Aggregate age distribution
-                for age, count in station_stats['age_distribution'].items():
-                    if age not in total_stats['age_distribution']:
-                        total_stats['age_distribution'][age] = 0
-                    total_stats['age_distribution'][age] += count
-                
-                # Track affected areas
-                if isinstance(station_stats['affected_areas'], (list, set)):
-                    total_stats['affected_areas'].update(station_stats['affected_areas'])
-                elif isinstance(station_stats['affected_areas'], int):
-                    total_stats['affected_areas'].add(station_stats['affected_areas'])
+            # Buffer every station and find all (station, area) pairs in one spatial index query
+            small_areas = self.data_loader.load_small_areas()
+            buffers = [create_geodesic_buffer(Point(coord), radius) for coord in line_coords]
+            _, area_idx = small_areas.sindex.query(buffers, predicate='intersects')
+            area_ids = small_areas.index[area_idx]
             
-            # Calculate coverage area (approximate, considering overlaps)
-            total_stats['total_coverage'] = len(total_stats['affected_areas'])
-            total_stats['affected_areas'] = list(total_stats['affected_areas'])
+            # Sum the population of every pair, so an area near two stations counts for both
+            population_pivot = self.data_loader.load_population_pivot()
+            area_pop = population_pivot.reindex(index=area_ids, fill_value=0)
+            age_distribution = area_pop.sum(axis=0).to_dict() if len(area_ids) else {}
             
-            return total_stats
-        except Exception as e:
-            print(f"Error in calculate_line_metrics: {e}")
+            # Calculate coverage area (approximate, considering overlaps)
+            affected_areas = list(dict.fromkeys(area_ids))
+            return {
+                'total_population': area_pop.to_numpy().sum(),
+                'age_distribution': age_distribution,
+                'affected_areas': affected_areas,
+                'total_coverage': len(affected_areas)
+            }
+        except DATA_ERRORS:
+            logger.exception("Error in calculate_line_metrics")
             return {
                 'total_population': 0,
                 'age_distribution': {},
@@ -91,32 +86,39 @@ class Statistics:
             population_data = self.data_loader.load_population_data()
             
             # Calculate total population per area
-            area_population = population_data.groupby('smasvaedi')['fjoldi'].sum().reset_index()
+            area_population = population_data.groupby('smasvaedi', observed=True)['fjoldi'].sum().reset_index()
+            
+            # Key the small areas by the population's categories, so the merge joins
+            # integer codes instead of hashing strings
+            smsv = pd.Categorical(small_areas.index, categories=area_population['smasvaedi'].cat.categories)
             
             # Merge with small areas
-            small_areas_with_density = small_areas.merge(
+            small_areas_with_density = small_areas.reset_index(drop=True).assign(smsv=smsv).merge(
                 area_population,
                 left_on='smsv',
                 right_on='smasvaedi',
-                how='left'
-            )
+                how='left',
+                validate='many_to_one'
+            ).drop(columns='smsv')
             
             # Fill NaN values with 0
             small_areas_with_density['fjoldi'] = small_areas_with_density['fjoldi'].fillna(0)
             
-            # Calculate area in km²
-            small_areas_with_density['area_km2'] = small_areas_with_density.geometry.area / 1_000_000
+            # Calculate area in km² in ISN93 meters, over the whole geometry array in one GEOS loop
+            area_km2 = shapely.area(small_areas_with_density.geometry.to_crs("EPSG:3057").values) / 1_000_000
+            small_areas_with_density['area_km2'] = area_km2
             
-            # Calculate density (handle division by zero)
-            small_areas_with_density['density'] = np.where(
-                small_areas_with_density['area_km2'] > 0,
-                small_areas_with_density['fjoldi'] / small_areas_with_density['area_km2'],
-                0
+            # Calculate density (areas of zero size get 0)
+            small_areas_with_density['density'] = np.divide(
+                small_areas_with_density['fjoldi'].to_numpy(dtype=float),
+                area_km2,
+                out=np.zeros_like(area_km2),
+                where=area_km2 > 0
             )
             
             return small_areas_with_density
-        except Exception as e:
-            print(f"Error in get_population_density_map: {e}")
+        except DATA_ERRORS:
+            logger.exception("Error in get_population_density_map")
             return small_areas
 
     def get_age_distribution_chart_data(self, area_ids=None):
@@ -134,8 +136,8 @@ class Statistics:
                 'ages': list(age_dist.keys()),
                 'counts': list(age_dist.values())
             }
-        except Exception as e:
-            print(f"Error in get_age_distribution_chart_data: {e}")
+        except DATA_ERRORS:
+            logger.exception("Error in get_age_distribution_chart_data")
             return {
                 'ages': [],
                 'counts': []
@@ -147,12 +149,13 @@ class Statistics:
             cityline = self.data_loader.load_cityline_data(year)
             small_areas = self.data_loader.load_small_areas()
             
-            # Get all affected areas
-            affected_areas = set()
-            for _, station in cityline.iterrows():
-                point = Point(station.geometry.coords[0])
-                areas = self.data_loader.get_areas_within_radius(point, radius, small_areas)
-                affected_areas.update(areas.index)
+            # Get all affected areas from one spatial index query over every station's buffer
+            buffers = np.array(
+                [create_geodesic_buffer(Point(geom.coords[0]), radius) for geom in cityline.geometry],
+                dtype=object
+            )
+            _, area_idx = small_areas.sindex.query(buffers, predicate='intersects')
+            affected_areas = small_areas.index[np.unique(area_idx)]
             
             # Calculate statistics
             total_areas = len(small_areas) if not small_areas.empty else 0
@@ -166,8 +169,8 @@ class Statistics:
                 'coverage_percentage': coverage_percentage,
                 'affected_area_ids': list(affected_areas)
             }
-        except Exception as e:
-            print(f"Error in get_coverage_statistics: {e}")
+        except DATA_ERRORS:
+            logger.exception("Error in get_coverage_statistics")
             return {
                 'total_areas': 0,
                 'covered_areas': 0,
@@ -1,9 +1,14 @@
 # src/transformation.py
 
-import json
+import ijson
+import orjson
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from pyproj import Transformer
+import numpy as np
 import logging
 
 # Set up logging
@@ -13,72 +18,177 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# CRS member written into every transformed file
+WGS84_CRS = {
+    "type": "name",
+    "properties": {
+        "name": "urn:ogc:def:crs:EPSG::4326"
+    }
+}
+
+# Number of features transformed together while streaming a file
+FEATURE_BATCH_SIZE = 1000
+
+@lru_cache(maxsize=None)
+def get_transformer(source_crs: str, target_crs: str) -> Transformer:
+    """Build a (lon, lat)-ordered transformer once per CRS pair and reuse it."""
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+def _transform_array(coords, tf: Transformer) -> np.ndarray:
+    """Transform an (N, 2) array of coordinates to [lon, lat] rows in one call."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    lon, lat = tf.transform(coords[:, 0], coords[:, 1])
+    return np.column_stack([lon, lat])  # GeoJSON standard is [longitude, latitude]
+
+def _transform_rings(rings: list, tf: Transformer) -> list:
+    """Transform a list of coordinate sequences with one call over all their vertices."""
+    if not rings:
+        return []
+    lens = [len(ring) for ring in rings]
+    flat = _transform_array(np.concatenate([np.asarray(ring, dtype=float).reshape(-1, 2) for ring in rings]), tf)
+    return [part.tolist() for part in np.split(flat, np.cumsum(lens)[:-1])]
+
+def _transform_point(coords, tf: Transformer) -> list:
+    """Transform a single position with one scalar call."""
+    lon, lat = tf.transform(coords[0], coords[1])
+    return [lon, lat]
+
+def _transform_sequence(coords, tf: Transformer) -> list:
+    """Transform a LineString or MultiPoint coordinate list."""
+    return _transform_array(coords, tf).tolist()
+
+def _transform_multipolygon(coords, tf: Transformer) -> list:
+    """Transform every ring of every polygon together, then regroup them per polygon."""
+    ring_counts = [len(polygon) for polygon in coords]
+    rings = _transform_rings([ring for polygon in coords for ring in polygon], tf)
+    bounds = np.cumsum([0] + ring_counts)
+    return [rings[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+# Coordinate transform for each GeoJSON geometry type
+_HANDLERS = {
+    'Point': _transform_point,
+    'LineString': _transform_sequence,
+    'MultiPoint': _transform_sequence,
+    'Polygon': _transform_rings,
+    'MultiLineString': _transform_rings,
+    'MultiPolygon': _transform_multipolygon,
+}
+
 class CoordinateTransformer:
     def __init__(self):
-        self.transformer = Transformer.from_crs("EPSG:3857", "EPSG:4326")
+        self.transformer = get_transformer("EPSG:3857", "EPSG:4326")
         
     def transform_coordinates(self, x: float, y: float) -> tuple:
         """Transform coordinates from EPSG:3857 to EPSG:4326."""
         try:
-            lat, lon = self.transformer.transform(x, y)
+            lon, lat = self.transformer.transform(x, y)
             return [lon, lat]  # GeoJSON standard is [longitude, latitude]
         except Exception as e:
             logger.error(f"Error transforming coordinates {x}, {y}: {str(e)}")
             raise
 
+    def transform_coordinate_array(self, coords) -> np.ndarray:
+        """Transform an (N, 2) array of EPSG:3857 coordinates to [lon, lat] rows in one call."""
+        return _transform_array(coords, self.transformer)
+
+    def transform_rings(self, rings: list) -> list:
+        """Transform a list of coordinate sequences with one call over all their vertices."""
+        return _transform_rings(rings, self.transformer)
+
     def transform_geometry(self, geometry: dict) -> dict:
         """Transform geometry coordinates based on geometry type."""
-        if geometry['type'] == 'Point':
-            geometry['coordinates'] = self.transform_coordinates(
-                geometry['coordinates'][0],
-                geometry['coordinates'][1]
-            )
-        elif geometry['type'] == 'LineString':
-            geometry['coordinates'] = [
-                self.transform_coordinates(x, y) 
-                for x, y in geometry['coordinates']
-            ]
-        elif geometry['type'] == 'Polygon':
-            geometry['coordinates'] = [
-                [self.transform_coordinates(x, y) for x, y in ring]
-                for ring in geometry['coordinates']
-            ]
-        elif geometry['type'] == 'MultiPoint':
-            geometry['coordinates'] = [
-                self.transform_coordinates(x, y) 
-                for x, y in geometry['coordinates']
-            ]
-        elif geometry['type'] == 'MultiLineString':
-            geometry['coordinates'] = [
-                [self.transform_coordinates(x, y) for x, y in line]
-                for line in geometry['coordinates']
-            ]
-        elif geometry['type'] == 'MultiPolygon':
-            geometry['coordinates'] = [
-                [[self.transform_coordinates(x, y) for x, y in ring]
-                 for ring in polygon]
-                for polygon in geometry['coordinates']
-            ]
+        handler = _HANDLERS.get(geometry['type'])
+        if handler is not None:
+            geometry['coordinates'] = handler(geometry['coordinates'], self.transformer)
         return geometry
 
+    def transform_features(self, features: list) -> list:
+        """Transform the geometries of a list of GeoJSON features."""
+        try:
+            # Imported here since run as a script this directory comes first on
+            # sys.path, and geopandas would pick up its statistics.py as the stdlib's
+            import geopandas as gpd
+            
+            # Reproject every geometry at once through a GeoDataFrame
+            gdf = gpd.GeoDataFrame.from_features(features, crs="EPSG:3857")
+            return list(gdf.to_crs("EPSG:4326").iterfeatures(na='null', drop_id=True))
+        except Exception as e:
+            # Fall back to transforming each feature's geometry
+            logger.warning(f"Vectorized transform failed, transforming features one by one: {str(e)}")
+            for feature in features:
+                feature['geometry'] = self.transform_geometry(feature['geometry'])
+            return features
+
     def transform_geojson(self, geojson_data: dict) -> dict:
         """Transform all geometries in a GeoJSON object."""
         transformed_geojson = geojson_data.copy()
         
         # Update CRS to WGS84
-        transformed_geojson['crs'] = {
-            "type": "name",
-            "properties": {
-                "name": "urn:ogc:def:crs:EPSG::4326"
-            }
-        }
+        transformed_geojson['crs'] = WGS84_CRS
         
-        # Transform each feature's geometry
-        for feature in transformed_geojson['features']:
-            feature['geometry'] = self.transform_geometry(feature['geometry'])
-            
+        transformed_geojson['features'] = self.transform_features(geojson_data['features'])
         return transformed_geojson
 
+def read_header(f) -> dict:
+    """Read the top-level members that come before a FeatureCollection's features in one streaming pass."""
+    header = {}
+    events = ijson.parse(f, use_float=True)
+    for prefix, event, value in events:
+        if prefix != '' or event != 'map_key':
+            continue
+        if value == 'features':
+            break
+        
+        # Build this member's value from its events, down to the matching end event
+        key = value
+        builder = ijson.ObjectBuilder()
+        depth = 0
+        for _, event, value in events:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                break
+        header[key] = builder.value
+    return header
+
+def process_file(file_path: Path, output_dir: Path) -> None:
+    """Transform one GeoJSON file to EPSG:4326 and write it to the output directory."""
+    output_path = output_dir / f"{file_path.stem}_4326.geojson"
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    try:
+        logger.info(f"Processing file: {file_path.name}")
+        
+        # Each worker process builds its own transformer
+        transformer = CoordinateTransformer()
+        
+        with open(file_path, 'rb') as f_in, open(tmp_path, 'wb') as f_out:
+            # Keep the collection's other top-level members, with the CRS updated to WGS84
+            header = {'type': 'FeatureCollection', **read_header(f_in)}
+            header['crs'] = WGS84_CRS
+            f_in.seek(0)
+            f_out.write(orjson.dumps(header)[:-1] + b',"features":[')
+            
+            # Stream the features and transform them a batch at a time, so only one
+            # batch is ever held in memory
+            features = ijson.items(f_in, 'features.item', use_float=True)
+            separator = b''
+            while batch := list(islice(features, FEATURE_BATCH_SIZE)):
+                for feature in transformer.transform_features(batch):
+                    f_out.write(separator + orjson.dumps(feature, option=orjson.OPT_SERIALIZE_NUMPY))
+                    separator = b','
+            f_out.write(b']}')
+        
+        # Only replace the output once the whole file has been written
+        os.replace(tmp_path, output_path)
+        logger.info(f"Successfully transformed {file_path.name} to {output_path.name}")
+        
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        logger.error(f"Error processing {file_path.name}: {str(e)}")
+
 def process_files():
     """Process all GeoJSON files in the data/raw/geo directory."""
     # Setup paths
@@ -89,30 +199,10 @@ def process_files():
     # Create output directory if it doesn't exist
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Initialize transformer
-    transformer = CoordinateTransformer()
-    
-    # Process each .geojson file in the input directory
-    for file_path in input_dir.glob('*.geojson'):
-        try:
-            logger.info(f"Processing file: {file_path.name}")
-            
-            # Read input file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                geojson_data = json.load(f)
-            
-            # Transform coordinates
-            transformed_data = transformer.transform_geojson(geojson_data)
-            
-            # Write output file
-            output_path = output_dir / f"{file_path.stem}_4326.geojson"
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(transformed_data, f, indent=2)
-            
-            logger.info(f"Successfully transformed {file_path.name} to {output_path.name}")
-            
-        except Exception as e:
-            logger.error(f"Error processing {file_path.name}: {str(e)}")
+    # The files are independent, so transform them in parallel processes
+    file_paths = list(input_dir.glob('*.geojson'))
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(process_file, file_paths, [output_dir] * len(file_paths)))
 
 if __name__ == "__main__":
     process_files()
\ No newline at end of file
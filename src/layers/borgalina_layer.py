@@ -1,13 +1,25 @@
+import itertools
 import folium
-import json
+import numpy as np
+import orjson
 from folium import GeoJson
 
 class CircleHoverMarker(folium.CircleMarker):
     """Custom CircleMarker that shows buffer on hover"""
-    def __init__(self, location, radius, popup, color, buffer_radius=400, **kwargs):
+    # Numbers the markers created without a station index, so their class names never collide
+    _counter = itertools.count()
+    
+    def __init__(self, location, radius, popup, color, station_idx=None, buffer_radius=400, **kwargs):
         super().__init__(location=location, radius=radius, popup=popup, color=color, **kwargs)
         self.buffer_radius = buffer_radius
         
+        # The caller's station index gives a class name that is stable across runs;
+        # otherwise take the next number from the class counter
+        if station_idx is None:
+            buffer_class = f'buffer-auto-{next(CircleHoverMarker._counter)}'
+        else:
+            buffer_class = f'buffer-{station_idx}'
+        
         # Create and store the buffer circle as an instance attribute
         self._buffer = folium.Circle(
             location=location,
@@ -17,13 +29,13 @@ class CircleHoverMarker(folium.CircleMarker):
             opacity=0.4,
             fill_opacity=0.2,
             weight=1,
-            className=f'buffer-{hash(str(location))}'
+            className=buffer_class
         )
         
         # Add hover JavaScript
         self.hover_js = f"""
             <script>
-                var circle = document.querySelector('.buffer-{hash(str(location))}');
+                var circle = document.querySelector('.{buffer_class}');
                 circle.style.display = 'none';
                 var marker = document.querySelector('#{self.get_name()}');
                 marker.addEventListener('mouseover', function() {{
@@ -49,26 +61,26 @@ def create_borgarlina_layer():
     """
     try:
         # Read the JSON data
-        with open('data/processed/cityline_2025_4326.geojson', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # Create lists to store points for each line
-        red_line_points = []
-        blue_line_points = []
-        stations = []
+        with open('data/processed/cityline_2025_4326.geojson', 'rb') as f:
+            data = orjson.loads(f.read())
 
-        # Sort features by line color and store coordinates
-        for feature in data['features']:
-            coords = feature['geometry']['coordinates']
-            if feature['properties']['line'] == 'red':
-                red_line_points.append(coords)
-            else:
-                blue_line_points.append(coords)
-            stations.append({
-                'coords': coords,
+        features = data['features']
+        
+        # Swap every station's [lon, lat] to folium's [lat, lon] and split them by
+        # line color with one boolean mask
+        locations = np.asarray([feature['geometry']['coordinates'] for feature in features], dtype=float).reshape(-1, 2)[:, ::-1]
+        red_mask = np.array([feature['properties']['line'] for feature in features]) == 'red'
+        red_line_points = locations[red_mask].tolist()
+        blue_line_points = locations[~red_mask].tolist()
+        
+        stations = [
+            {
+                'coords': feature['geometry']['coordinates'],
                 'name': feature['properties']['name'],
                 'color': feature['properties']['line']
-            })
+            }
+            for feature in features
+        ]
 
         # Create feature groups
         lines_group = folium.FeatureGroup(name='Borgarlína Lines')
@@ -77,7 +89,7 @@ def create_borgarlina_layer():
         # Add red line
         if red_line_points:
             folium.PolyLine(
-                locations=[[p[1], p[0]] for p in red_line_points],
+                locations=red_line_points,
                 color='red',
                 weight=4,
                 opacity=0.8
@@ -86,7 +98,7 @@ def create_borgarlina_layer():
         # Add blue line
         if blue_line_points:
             folium.PolyLine(
-                locations=[[p[1], p[0]] for p in blue_line_points],
+                locations=blue_line_points,
                 color='blue',
                 weight=4,
                 opacity=0.8
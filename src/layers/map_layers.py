@@ -2,9 +2,34 @@ import plotly.graph_objects as go
 import plotly.express as px
 import json
 import numpy as np
-from shapely.geometry import Point, LineString
 from src.data_processing.age_groups import calculate_age_group_percentages, format_age_group_info
 from src.layers.straeto_layer import add_straeto_layer
+from src.map_data import simplify_for_zoom
+
+# Stable trace uid, so callbacks can find the affected areas trace in a figure
+AFFECTED_AREAS_UID = 'affected-areas'
+
+# Unit circle sampled once for every radius circle
+_THETA = np.linspace(0, 2*np.pi, 100)
+_COS_T = np.cos(_THETA)
+_SIN_T = np.sin(_THETA)
+
+# Translucent radius circle fill for each line colour
+_FILL_BY_COLOR = {
+    'red': "rgba(255,0,0,0.3)",
+    'blue': "rgba(0,0,255,0.3)",
+    'green': "rgba(0,128,0,0.3)",
+    'orange': "rgba(255,165,0,0.3)",
+    'purple': "rgba(128,0,128,0.3)"
+}
+
+def _circle_points(lons, lats, radius_meters):
+    """Sample radius circles around many centres at once as an (N, 100, 2) float32 lon/lat array"""
+    radius_in_degrees = radius_meters / 111000
+    lat_correction = np.cos(np.radians(lats))[:, None]
+    circle_lons = lons[:, None] + (radius_in_degrees / lat_correction) * _SIN_T
+    circle_lats = lats[:, None] + radius_in_degrees * _COS_T
+    return np.stack([circle_lons, circle_lats], axis=-1).astype(np.float32)
 
 class MapLayers:
     def __init__(self):
@@ -48,6 +73,11 @@ class MapLayers:
                           'Hlemmur', 'BSÍ', 'HÍ', 'Lækjartorg']
             }
         }
+        # Resolved line coordinates, radius circles and area GeoJSON, reused across re-renders
+        self._line_cache = {}
+        self._circle_cache = {}
+        self._geojson_cache = {}
+        self._feature_cache = {}
 
     def get_polygon_coordinates(self, geometry):
         """Extract coordinates from a geometry object, handling Point, Polygon, and MultiPolygon types"""
@@ -62,6 +92,51 @@ class MapLayers:
         else:
             raise ValueError(f"Unsupported geometry type: {geometry.geom_type}")
 
+    def get_small_areas_geojson(self, small_areas_data):
+        """
+        Build the geometry-only GeoJSON of the small areas, simplified for the default zoom.
+        
+        The area outlines are static, so the dict is cached on the area ids and
+        reused by the outline and density layers on every redraw.
+        """
+        key = tuple(small_areas_data.index)
+        if key not in self._geojson_cache:
+            simplified = simplify_for_zoom(small_areas_data[['geometry']], self.default_zoom)
+            self._geojson_cache[key] = simplified.__geo_interface__
+        return self._geojson_cache[key]
+
+    def get_affected_areas_geojson(self, small_areas_data, area_ids):
+        """
+        Select the given areas' features from the cached small areas GeoJSON.
+        
+        The selection highlight then reuses the simplified, geometry-only outlines
+        of the small areas layer instead of serializing the areas again per click.
+        """
+        key = tuple(small_areas_data.index)
+        if key not in self._feature_cache:
+            geojson = self.get_small_areas_geojson(small_areas_data)
+            self._feature_cache[key] = {feature['id']: feature for feature in geojson['features']}
+        features = self._feature_cache[key]
+        return {
+            'type': 'FeatureCollection',
+            'features': [features[area_id] for area_id in area_ids if area_id in features]
+        }
+
+    def get_line_coordinates(self, station_coords, year):
+        """Resolve each line's station sequence for a year to (lons, lats) arrays, cached per station set"""
+        key = (year, tuple(station_coords.items()))
+        if key not in self._line_cache:
+            year_sequences = self.line_sequences.get(year, self.line_sequences['2025'])
+            lines = {}
+            for line_color, sequence in year_sequences.items():
+                valid_sequence = [s for s in sequence if s in station_coords]
+                
+                if len(valid_sequence) > 1:
+                    coords = np.array([station_coords[name] for name in valid_sequence])
+                    lines[line_color] = (coords[:, 0], coords[:, 1])
+            self._line_cache[key] = lines
+        return self._line_cache[key]
+
     def create_base_map(self):
         """Create the base map with initial settings"""
         fig = go.Figure()
@@ -87,8 +162,8 @@ class MapLayers:
 
             fig.add_trace(go.Scattermapbox(
                 mode="markers",
-                lon=schools_data.geometry.x,
-                lat=schools_data.geometry.y,
+                lon=schools_data.geometry.x.to_numpy(dtype=np.float32),
+                lat=schools_data.geometry.y.to_numpy(dtype=np.float32),
                 marker=dict(
                     size=5,
                     color='orange',
@@ -112,68 +187,65 @@ class MapLayers:
             if geojson_data.empty:
                 return fig
 
-            station_coords = {}
-            for _, station in geojson_data.iterrows():
-                coords = list(station.geometry.coords)[0]
-                station_coords[station['name']] = coords
-
-            year_sequences = self.line_sequences.get(year, self.line_sequences['2025'])
+            # float32 keeps ~0.4 m precision here and halves the coordinates sent to the browser
+            xs = geojson_data.geometry.x.to_numpy(dtype=np.float32)
+            ys = geojson_data.geometry.y.to_numpy(dtype=np.float32)
+            names = geojson_data['name'].to_numpy()
+            station_coords = dict(zip(names, zip(xs, ys)))
 
             # Add lines first (so they appear under stations)
-            for line_color, sequence in year_sequences.items():
-                valid_sequence = [s for s in sequence if s in station_coords]
-                
-                if len(valid_sequence) > 1:
-                    line_lons = [station_coords[name][0] for name in valid_sequence]
-                    line_lats = [station_coords[name][1] for name in valid_sequence]
-                    
-                    fig.add_trace(go.Scattermapbox(
-                        mode="lines",
-                        lon=line_lons,
-                        lat=line_lats,
-                        line=dict(width=3, color=self.line_colors[line_color]),
-                        name=f"{line_color.capitalize()} Line",
-                        showlegend=True
-                    ))
-
-            # Then add stations on top
-            for _, station in geojson_data.iterrows():
-                coords = list(station.geometry.coords)[0]
-                lines = station['line'].split('/')
-                size = 15 if len(lines) > 1 else 10
-                color = self.line_colors[lines[0]]
-                station_name = station['name']
-                
-                # Add station marker
+            for line_color, (line_lons, line_lats) in self.get_line_coordinates(station_coords, year).items():
                 fig.add_trace(go.Scattermapbox(
-                    mode="markers+text",
-                    lon=[coords[0]],
-                    lat=[coords[1]],
-                    marker=dict(
-                        size=size,
-                        color=color,
-                        opacity=0.8
-                    ),
-                    text=[station_name],
-                    textposition="top center",
-                    name=station_name,
-                    customdata=[{
-                        'name': station_name,
-                        'line': station['line']
-                    }],
-                    hovertemplate=(
-                        "<b>%{text}</b><br>" +
-                        "<br>Click for details<extra></extra>"
-                    ),
-                    showlegend=False
+                    mode="lines",
+                    lon=line_lons,
+                    lat=line_lats,
+                    line=dict(width=3, color=self.line_colors[line_color]),
+                    name=f"{line_color.capitalize()} Line",
+                    showlegend=True
                 ))
 
+            # Then add every station on top as one marker trace, coloured by its
+            # first line; stations shared by several lines are drawn larger
+            lines = geojson_data['line'].to_numpy()
+            first_colors = geojson_data['line'].str.split('/').str[0].to_numpy()
+            
+            fig.add_trace(go.Scattermapbox(
+                mode="markers+text",
+                lon=xs,
+                lat=ys,
+                marker=dict(
+                    size=np.where(first_colors != lines, 15, 10),
+                    color=[self.line_colors[first_color] for first_color in first_colors],
+                    opacity=0.8
+                ),
+                text=names,
+                textposition="top center",
+                name="Stations",
+                customdata=[
+                    {'name': name, 'line': line}
+                    for name, line in zip(names, lines)
+                ],
+                hovertemplate=(
+                    "<b>%{text}</b><br>" +
+                    "<br>Click for details<extra></extra>"
+                ),
+                showlegend=False
+            ))
+
         except Exception as e:
             print(f"Error adding cityline layer: {e}")
             import traceback
             traceback.print_exc()
         return fig
 
+    def get_circle_colors(self, line_color):
+        """Return the outline and translucent fill colour for a station's radius circle"""
+        if '/' in line_color:
+            line_color = line_color.split('/')[0]
+        
+        base_color = self.line_colors.get(line_color, 'red')
+        return base_color, _FILL_BY_COLOR.get(base_color, _FILL_BY_COLOR['red'])
+
     def add_radius_circle(self, fig, geometry, radius, line_color='red'):
         """Add a circle showing the coverage radius around a point"""
         try:
@@ -182,36 +254,18 @@ class MapLayers:
                 return fig
 
             coords = list(geometry.coords)[0]
-            center_point = Point(coords)
-            
-            theta = np.linspace(0, 2*np.pi, 100)
-            radius_in_degrees = radius / 111000
-            
-            lat_correction = np.cos(np.radians(center_point.y))
+            key = (round(coords[0], 6), round(coords[1], 6), radius)
+            if key not in self._circle_cache:
+                circle = _circle_points(np.array([coords[0]]), np.array([coords[1]]), radius)[0]
+                self._circle_cache[key] = (circle[:, 0], circle[:, 1])
+            circle_lons, circle_lats = self._circle_cache[key]
             
-            circle_lats = center_point.y + radius_in_degrees * np.cos(theta)
-            circle_lons = center_point.x + (radius_in_degrees / lat_correction) * np.sin(theta)
-            
-            if '/' in line_color:
-                line_color = line_color.split('/')[0]
-            
-            base_color = self.line_colors.get(line_color, 'red')
-            
-            rgb_values = {
-                'red': (255, 0, 0),
-                'blue': (0, 0, 255),
-                'green': (0, 128, 0),
-                'orange': (255, 165, 0),
-                'purple': (128, 0, 128)
-            }
-            
-            rgb = rgb_values.get(base_color, (255, 0, 0))
-            fill_color = f"rgba({rgb[0]},{rgb[1]},{rgb[2]},0.3)"
+            base_color, fill_color = self.get_circle_colors(line_color)
             
             fig.add_trace(go.Scattermapbox(
                 mode="lines",
-                lon=circle_lons.tolist(),
-                lat=circle_lats.tolist(),
+                lon=circle_lons,
+                lat=circle_lats,
                 fill="toself",
                 fillcolor=fill_color,
                 line=dict(
@@ -230,6 +284,83 @@ class MapLayers:
             traceback.print_exc()
         return fig
 
+    def add_radius_circles(self, fig, geometries, radius, line_colors):
+        """Add the radius circles for many points, as one trace per circle colour"""
+        try:
+            if len(geometries) == 0:
+                return fig
+
+            circles = _circle_points(geometries.x.to_numpy(), geometries.y.to_numpy(), radius)
+            
+            # Separate the circles with a NaN vertex so each one is filled on its own
+            gaps = np.full((len(circles), 1, 2), np.nan, dtype=np.float32)
+            circles = np.concatenate([circles, gaps], axis=1)
+            
+            colors = np.array([self.get_circle_colors(line_color) for line_color in line_colors])
+            for base_color, fill_color in dict.fromkeys(map(tuple, colors)):
+                points = circles[colors[:, 0] == base_color].reshape(-1, 2)[:-1]
+                
+                fig.add_trace(go.Scattermapbox(
+                    mode="lines",
+                    lon=points[:, 0],
+                    lat=points[:, 1],
+                    fill="toself",
+                    fillcolor=fill_color,
+                    line=dict(
+                        width=1,
+                        color=base_color
+                    ),
+                    opacity=1,
+                    name=f"{radius}m Coverage",
+                    showlegend=False,
+                    hoverinfo="skip"
+                ))
+            
+        except Exception as e:
+            print(f"Error adding radius circles: {e}")
+            import traceback
+            traceback.print_exc()
+        return fig
+
+    def create_affected_areas_trace(self, affected_areas_json):
+        """Build the light blue affected areas trace, empty when there are no areas"""
+        points = np.empty((0, 2), dtype=np.float32)
+        if affected_areas_json and 'features' in affected_areas_json:
+            # Collect every area outline into one trace, separated by a NaN vertex
+            gap = np.full((1, 2), np.nan, dtype=np.float32)
+            parts = []
+            for feature in affected_areas_json['features']:
+                geometry = feature['geometry']
+                if geometry['type'] == 'Polygon':
+                    rings = [geometry['coordinates'][0]]
+                elif geometry['type'] == 'MultiPolygon':
+                    rings = [polygon[0] for polygon in geometry['coordinates']]
+                else:
+                    continue
+                
+                for coords in rings:
+                    parts.append(np.asarray(coords, dtype=np.float32))
+                    parts.append(gap)
+            
+            if parts:
+                points = np.concatenate(parts[:-1])
+        
+        return go.Scattermapbox(
+            mode="lines",
+            lon=points[:, 0],
+            lat=points[:, 1],
+            fill="toself",
+            fillcolor="rgba(135,206,250,0.4)",
+            line=dict(
+                width=1,
+                color="rgba(30,144,255,0.8)"
+            ),
+            name="Affected Area",
+            uid=AFFECTED_AREAS_UID,
+            showlegend=False,
+            hoverinfo="skip"
+        )
+
     def add_affected_areas_layer(self, fig, affected_areas_json):
         """Add affected areas layer with light blue highlight"""
         try:
@@ -237,25 +368,9 @@ class MapLayers:
                 print("No valid affected areas data")
                 return fig
             
-            for feature in affected_areas_json['features']:
-                if feature['geometry']['type'] == 'Polygon':
-                    coords = feature['geometry']['coordinates'][0]
-                    lons, lats = zip(*coords)
-                    
-                    fig.add_trace(go.Scattermapbox(
-                        mode="lines",
-                        lon=list(lons),
-                        lat=list(lats),
-                        fill="toself",
-                        fillcolor="rgba(135,206,250,0.4)",
-                        line=dict(
-                            width=1,
-                            color="rgba(30,144,255,0.8)"
-                        ),
-                        name="Affected Area",
-                        showlegend=False,
-                        hoverinfo="skip"
-                    ))
+            trace = self.create_affected_areas_trace(affected_areas_json)
+            if len(trace.lon):
+                fig.add_trace(trace)
             
         except Exception as e:
             print(f"Error adding affected areas layer: {e}")
@@ -274,15 +389,16 @@ class MapLayers:
             print(f"Sample geometry type: {small_areas_data.geometry.iloc[0].geom_type}")
             
             # Convert GeoDataFrame to GeoJSON for Plotly
-            geojson_data = small_areas_data.__geo_interface__
+            geojson_data = self.get_small_areas_geojson(small_areas_data)
             print(f"GeoJSON features: {len(geojson_data['features'])}")
 
             if show_population and 'fjoldi' in small_areas_data.columns:
                 # Show population density choropleth
                 fig.add_trace(go.Choroplethmapbox(
                     geojson=geojson_data,
-                    locations=small_areas_data.index,
-                    z=small_areas_data['fjoldi'],
+                    locations=small_areas_data.index.to_numpy(),
+                    featureidkey='id',
+                    z=small_areas_data['fjoldi'].to_numpy(),
                     colorscale='Viridis',
                     marker=dict(
                         opacity=0.7,
@@ -304,16 +420,15 @@ class MapLayers:
                         "<b>Population:</b> %{z}<br>" +
                         "<extra></extra>"
                     ),
-                    customdata=[[
-                        small_areas_data.at[idx, 'smsv_label']
-                    ] for idx in small_areas_data.index]
+                    customdata=small_areas_data[['smsv_label']].to_numpy()
                 ))
             else:
                 # Show only outlines
                 fig.add_trace(go.Choroplethmapbox(
                     geojson=geojson_data,
-                    locations=small_areas_data.index,
-                    z=[1] * len(small_areas_data),
+                    locations=small_areas_data.index.to_numpy(),
+                    featureidkey='id',
+                    z=np.ones(len(small_areas_data), dtype=np.int8),
                     colorscale=[[0, "rgba(0,0,0,0)"], [1, "rgba(0,0,0,0)"]],  # Transparent fill
                     showscale=False,
                     marker=dict(
@@ -329,9 +444,7 @@ class MapLayers:
                         "<b>Area:</b> %{customdata[0]}<br>" +
                         "<extra></extra>"
                     ),
-                    customdata=[[
-                        small_areas_data.at[idx, 'smsv_label']
-                    ] for idx in small_areas_data.index]
+                    customdata=small_areas_data[['smsv_label']].to_numpy()
                 ))
             
         except Exception as e:
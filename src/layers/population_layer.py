@@ -1,13 +1,28 @@
 import folium
 import pandas as pd
 import branca.colormap as cm
+from src.map_data import colormap_fill
+import logging
 import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def _load_population(year):
+    """Read the summarized population CSV for a year once per process"""
+    population_path = os.path.join('data', 'processed', 'habitants', f'summarized_population_{year}.csv')
+    return pd.read_csv(
+        population_path,
+        encoding='utf-8',
+        usecols=['ar', 'smasvaedi', 'fjoldi'],
+        dtype={'ar': 'int32', 'smasvaedi': 'int32', 'fjoldi': 'int32'}
+    )
 
 def create_population_layer(gdf, year=2023):
     try:
         # Read population data
-        population_path = os.path.join('data', 'processed', 'habitants', f'summarized_population_{year}.csv')
-        population_df = pd.read_csv(population_path, encoding='utf-8')
+        population_df = _load_population(year)
         
         # Process population data
         max_year = population_df['ar'].max()
@@ -20,9 +35,9 @@ def create_population_layer(gdf, year=2023):
         zone_population['smasvaedi'] = zone_population['smasvaedi'].astype(str).str.zfill(4)
         gdf['zone_code'] = gdf['zone_code'].astype(str).str.zfill(4)
         
-        print("\nBefore merge:")
-        print("Sample zone_codes:", gdf['zone_code'].head())
-        print("Sample smasvaedi:", zone_population['smasvaedi'].head())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Before merge:\nSample zone_codes:\n%s\nSample smasvaedi:\n%s",
+                         gdf['zone_code'].head(), zone_population['smasvaedi'].head())
         
         # Merge dataframes
         updated_gdf = gdf.merge(
@@ -32,11 +47,9 @@ def create_population_layer(gdf, year=2023):
             how='left'
         )
         
-        print("\nAfter merge:")
-        print("Number of rows in original GDF:", len(gdf))
-        print("Number of rows after merge:", len(updated_gdf))
-        print("Sample of merged data:")
-        print(updated_gdf[['zone_code', 'smasvaedi', 'fjoldi']].head())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("After merge: %d rows in original GDF, %d rows after merge\nSample of merged data:\n%s",
+                         len(gdf), len(updated_gdf), updated_gdf[['zone_code', 'smasvaedi', 'fjoldi']].head())
         
         # Create population layer
         population_layer = folium.FeatureGroup(name='Population Density')
@@ -53,12 +66,17 @@ def create_population_layer(gdf, year=2023):
             caption=f'Population ({max_year})'
         )
         
+        # Look up each zone's fill colour once instead of per feature at render time
+        layer_gdf = updated_gdf[['smsv_label', 'fjoldi', 'geometry']].assign(
+            _fill=colormap_fill(colormap, updated_gdf['fjoldi'].to_numpy())
+        )
+        
+        # Hand folium a dict of just the styled and tooltip columns instead of
+        # a JSON string it would have to parse again
         folium.GeoJson(
-            updated_gdf.to_json(),
+            layer_gdf.__geo_interface__,
             style_function=lambda feature: {
-                'fillColor': colormap(feature['properties']['fjoldi']) 
-                    if feature['properties'].get('fjoldi') is not None 
-                    else '#CCCCCC',
+                'fillColor': feature['properties']['_fill'],
                 'color': 'black',
                 'weight': 1,
                 'fillOpacity': 0.2
@@ -1,6 +1,27 @@
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
+from src.map_data import match_popular_stops
+
+@lru_cache(maxsize=None)
+def _load_stops():
+    """Read the bus stops with coordinates once per process"""
+    stops_df = pd.read_csv(
+        'data/raw/bus/stops.txt',
+        engine='pyarrow',
+        usecols=['stop_id', 'stop_name', 'stop_lat', 'stop_lon']
+    )
+    return stops_df.dropna(subset=['stop_lat', 'stop_lon'])
+
+@lru_cache(maxsize=None)
+def _load_popular_stops():
+    """Read the top 20 stops once per process, sorted by popularity rating"""
+    popular_stops_df = pd.read_csv('data/processed/20.csv')
+    return popular_stops_df.sort_values('Popularity rating', kind='stable')
+
 def add_straeto_layer(fig):
     """Add stræto layer to the map showing bus stops with emphasis on the 20 most used stops"""
     if fig is None:
@@ -9,80 +30,55 @@ def add_straeto_layer(fig):
 
     try:
         # Load bus stops data
-        stops_df = pd.read_csv('data/raw/bus/stops.txt')
-        stops_df = stops_df[['stop_id', 'stop_name', 'stop_lat', 'stop_lon']]
-        stops_df = stops_df.dropna(subset=['stop_lat', 'stop_lon'])
+        stops_df = _load_stops()
         
         # Load top 20 stops data
-        popular_stops_df = pd.read_csv('data/processed/20.csv')
-        popular_stop_names = set(popular_stops_df['stop_name'])
-        flow_dict = dict(zip(popular_stops_df['stop_name'], 
-                           popular_stops_df['Passenger flow in 2023']))
-        rank_dict = dict(zip(popular_stops_df['stop_name'], 
-                           popular_stops_df['Popularity rating']))
+        popular_stops_df = _load_popular_stops()
         
-        # Add regular stops
-        regular_stops = []
-        popular_stops = []
+        # Match every stop against the popular names; the index picks the highest ranked match
+        is_popular, matching_idx = match_popular_stops(
+            stops_df['stop_name'].to_numpy(dtype=str),
+            popular_stops_df['stop_name'].to_numpy(dtype=str)
+        )
+        matching_idx = matching_idx[is_popular]
         
-        for _, stop in stops_df.iterrows():
-            stop_name = stop['stop_name']
-            is_popular = any(stop_name.startswith(pop_name) or pop_name.startswith(stop_name) 
-                           for pop_name in popular_stop_names)
-            
-            if is_popular:
-                matching_name = next(pop_name for pop_name in popular_stop_names 
-                                   if stop_name.startswith(pop_name) or pop_name.startswith(stop_name))
-                rank = rank_dict[matching_name]
-                size = 20 - ((rank - 1) * 0.25)  # Size decreases with rank
-                
-                popular_stops.append({
-                    'lat': stop['stop_lat'],
-                    'lon': stop['stop_lon'],
-                    'name': stop_name,
-                    'rank': rank,
-                    'flow': flow_dict[matching_name],
-                    'size': size
-                })
-            else:
-                regular_stops.append({
-                    'lat': stop['stop_lat'],
-                    'lon': stop['stop_lon'],
-                    'name': stop_name
-                })
+        regular_stops = stops_df[~is_popular]
+        popular_stops = stops_df[is_popular]
+        ranks = popular_stops_df['Popularity rating'].to_numpy()[matching_idx]
+        flows = popular_stops_df['Passenger flow in 2023'].to_numpy()[matching_idx]
         
         # Add regular stops trace
-        if regular_stops:
+        if len(regular_stops):
             fig.add_trace(go.Scattermapbox(
                 mode='markers',
-                lon=[stop['lon'] for stop in regular_stops],
-                lat=[stop['lat'] for stop in regular_stops],
+                lon=regular_stops['stop_lon'].to_numpy(dtype=np.float32),
+                lat=regular_stops['stop_lat'].to_numpy(dtype=np.float32),
                 marker=dict(
                     size=6,
                     color='white',
                     opacity=0.6,
                     symbol='circle'
                 ),
-                text=[stop['name'] for stop in regular_stops],
+                text=regular_stops['stop_name'].to_numpy(),
                 name='Regular Stops',
                 hovertemplate="<b>%{text}</b><br><extra></extra>",
                 showlegend=True
             ))
         
         # Add popular stops trace
-        if popular_stops:
+        if len(popular_stops):
             fig.add_trace(go.Scattermapbox(
                 mode='markers',
-                lon=[stop['lon'] for stop in popular_stops],
-                lat=[stop['lat'] for stop in popular_stops],
+                lon=popular_stops['stop_lon'].to_numpy(dtype=np.float32),
+                lat=popular_stops['stop_lat'].to_numpy(dtype=np.float32),
                 marker=dict(
-                    size=[stop['size'] for stop in popular_stops],
+                    size=20 - ((ranks - 1) * 0.25),  # Size decreases with rank
                     color='#2d6a3e',  # Medium green
                     opacity=0.8,
                     symbol='circle'
                 ),
-                text=[f"{stop['name']}<br>Daily Passengers: {stop['flow']:,}<br>Rank: #{stop['rank']}" 
-                      for stop in popular_stops],
+                text=[f"{name}<br>Daily Passengers: {flow:,}<br>Rank: #{rank}" 
+                      for name, flow, rank in zip(popular_stops['stop_name'], flows, ranks)],
                 name='Top 20 Stops',
                 hovertemplate="<b>%{text}</b><br><extra></extra>",
                 showlegend=True
@@ -1,9 +1,11 @@
 import pandas as pd
-import folium
-import branca.colormap as cm
+import plotly.graph_objects as go
+
+# Orange-red sequential scale shared by every student layer
+STUDENT_COLORS = ['#fff7ec', '#fee8c8', '#fdd49e', '#fdbb84', '#fc8d59', '#ef6548', '#d7301f', '#990000']
 
 def create_student_layers(gdf):
-    """Create layers for student age groups"""
+    """Create Choroplethmapbox traces for student age groups"""
     
     # Define age groups and their labels
     age_groups = {
@@ -12,44 +14,46 @@ def create_student_layers(gdf):
         'high': '16-19 years'
     }
     
+    # Serialize the geometries once for all the traces
+    geojson = gdf[['geometry']].__geo_interface__
+    locations = gdf.index.astype(str)
+    colorscale = [[i / (len(STUDENT_COLORS) - 1), color] for i, color in enumerate(STUDENT_COLORS)]
+    
     student_layers = []
-    student_colormaps = []
     
     for group_id, group_label in age_groups.items():
         column_name = f'students_{group_id}'
         
         # Check if column exists and has data
-        if column_name in gdf.columns and not gdf[column_name].isna().all():
-            layer = folium.FeatureGroup(name=f'Students {group_label}')
-            
-            # Create colormap for this age group
-            values = gdf[column_name].dropna()
-            if len(values) > 0:
-                colormap = cm.LinearColormap(
-                    colors=['#fff7ec', '#fee8c8', '#fdd49e', '#fdbb84', '#fc8d59', '#ef6548', '#d7301f', '#990000'],
-                    vmin=values.min(),
-                    vmax=values.max(),
-                    caption=f'Students {group_label}'
+        if column_name not in gdf.columns or gdf[column_name].isna().all():
+            continue
+        
+        # Only the first group starts visible so the colorbars don't overlap
+        student_layers.append(go.Choroplethmapbox(
+            geojson=geojson,
+            locations=locations,
+            z=gdf[column_name].fillna(0).to_numpy(),
+            colorscale=colorscale,
+            marker=dict(
+                opacity=0.7,
+                line=dict(
+                    width=1,
+                    color='black'
                 )
+            ),
+            name=f'Students {group_label}',
+            visible=True if not student_layers else 'legendonly',
+            showlegend=True,
+            colorbar=dict(
+                title=f'Students {group_label}',
+                thickness=15,
+                len=0.5,
+                x=0.95
+            ),
+            hovertemplate=(
+                f"<b>Students {group_label}:</b> %{{z}}<br>" +
+                "<extra></extra>"
+            )
+        ))
                 
-                # Create GeoJson layer
-                folium.GeoJson(
-                    gdf,
-                    style_function=lambda feature: {
-                        'fillColor': colormap(feature['properties'].get(column_name, 0)),
-                        'color': 'black',
-                        'weight': 1,
-                        'fillOpacity': 0.7
-                    },
-                    tooltip=folium.GeoJsonTooltip(
-                        fields=[column_name],
-                        aliases=[f'Students {group_label}:'],
-                        localize=True,
-                        sticky=True
-                    )
-                ).add_to(layer)
-                
-                student_layers.append(layer)
-                student_colormaps.append(colormap)
-                
-    return student_layers, student_colormaps
\ No newline at end of file
+    return student_layers
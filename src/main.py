@@ -1,22 +1,50 @@
-from dash import Dash, html, dcc, Input, Output, State, callback_context
+from dash import Dash, html, dcc, Input, Output, State, Patch, callback_context
+from flask.json.provider import DefaultJSONProvider
 import plotly.express as px
 from src.controls.layer_controls import LayerControls
-from src.layers.map_layers import MapLayers
+from src.layers.map_layers import AFFECTED_AREAS_UID, MapLayers
 from src.data_processing.data_loader import DataLoader
 from src.data_processing.station_coverage import calculate_station_coverage
 from src.data_processing.age_groups import calculate_age_group_percentages, format_age_group_info
 import json
 import geopandas as gpd
+import logging
+import orjson
+import os
 import sys
+from collections import OrderedDict
+from functools import lru_cache
 from shapely.geometry import MultiPolygon
 
+logger = logging.getLogger(__name__)
+
 # Initialize components
 data_loader = DataLoader()
 map_layers = MapLayers()
 
+# Figure dicts and affected areas trace indices from recent update_map calls, most recently used last
+FIGURE_CACHE_SIZE = 32
+_figure_cache = OrderedDict()
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson, falling back to Flask's default for other types"""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize the Dash app
 app = Dash(__name__, suppress_callback_exceptions=True)
 
+# Callback requests carry the figure and the stores as JSON; parse them with orjson
+app.server.json = OrjsonProvider(app.server)
+
+# WSGI entry point for a production server, e.g. gunicorn -w 4 src.main:server.
+# Each worker keeps its own figure cache; nothing in the callbacks relies on
+# a click landing in the worker that built the figure on screen
+server = app.server
+
 # Create the app layout
 app.layout = html.Div([
     # Main container
@@ -61,18 +89,14 @@ app.layout = html.Div([
     'padding': 0
 })
 
-def get_polygon_coordinates(geometry):
-    """Extract coordinates from a geometry object, handling Point, Polygon, and MultiPolygon types"""
-    if geometry.geom_type == 'Point':
-        return list(geometry.coords)[0]
-    elif geometry.geom_type == 'Polygon':
-        return list(geometry.exterior.coords)
-    elif geometry.geom_type == 'MultiPolygon':
-        # For MultiPolygon, use the largest polygon's coordinates
-        largest_polygon = max(geometry.geoms, key=lambda p: p.area)
-        return list(largest_polygon.exterior.coords)
-    else:
-        raise ValueError(f"Unsupported geometry type: {geometry.geom_type}")
+@lru_cache(maxsize=None)
+def get_zone_population(age_group=None):
+    """Population per small area id, for one age group or all of them, computed once per group"""
+    population_data = data_loader.load_population_data()
+    if age_group:
+        age_range = f"{age_group} ára"
+        population_data = population_data[population_data['aldursflokkur'] == age_range]
+    return population_data.groupby('smasvaedi', observed=True)['fjoldi'].sum()
 
 @app.callback(
     [Output('selected-station-store', 'data'),
@@ -114,47 +138,23 @@ def handle_click(clickData, radius, selected_year):
             # Get affected areas
             point_geom = station.geometry
             affected_areas = data_loader.get_areas_within_radius(point_geom, radius or 400)
-            affected_areas_json = affected_areas.__geo_interface__
+            affected_areas_json = map_layers.get_affected_areas_geojson(data_loader.load_small_areas(), affected_areas.index)
             
             # Extract station coordinates
             station_coords = list(point_geom.coords)[0]
             
-            # Prepare area data for coverage calculation
-            area_data = []
-            for idx, geom in affected_areas.geometry.items():
-                try:
-                    coords = get_polygon_coordinates(geom)
-                    area_data.append({
-                        "id": str(idx),
-                        "geometry": coords
-                    })
-                except Exception as e:
-                    print(f"Error processing area {idx}: {e}")
-                    continue
-            
-            # Calculate coverage for each area using just the lon, lat coordinates
+            # Calculate coverage for each area straight from its shapely geometry
             covered_areas = calculate_station_coverage(
-                area_data,
+                affected_areas.geometry,
                 (station_coords[0], station_coords[1]),  # Extract just lon, lat
                 radius or 400
             )
             
-            # Calculate age group percentages
-            small_areas = data_loader.load_small_areas()
-            formatted_areas = []
-            for idx, geom in small_areas.geometry.items():
-                try:
-                    area_coords = get_polygon_coordinates(geom)
-                    formatted_areas.append({
-                        "id": str(idx),
-                        "geometry": area_coords
-                    })
-                except Exception as e:
-                    print(f"Error formatting area {idx}: {e}")
-                    continue
-            
-            # Calculate age group percentages
-            percentages = calculate_age_group_percentages(station_coords, radius or 400, formatted_areas)
+            # Calculate age group percentages from the same coverage instead of
+            # querying and intersecting the areas a second time
+            percentages = calculate_age_group_percentages(
+                station_coords, radius or 400, affected_areas.geometry, data_loader, covered_areas=covered_areas
+            )
             age_groups = format_age_group_info(percentages)
             
             # Prepare station info
@@ -166,8 +166,10 @@ def handle_click(clickData, radius, selected_year):
                 'age_groups': age_groups
             }
             
-            print("\nStation Info:", station_info)  # Debug print
-            print("Covered Areas:", covered_areas)  # Debug print
+            # Formatting these dicts is only worth it when someone reads the output
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Station Info: %s", station_info)
+                logger.debug("Covered Areas: %s", covered_areas)
             
             return station_info, affected_areas_json
             
@@ -194,11 +196,12 @@ def update_bus_stop_info(station_info):
         covered_areas = station_info.get('covered_areas', [])
         age_groups = station_info.get('age_groups', [])
         
-        print("\nUpdating bus stop info:")  # Debug print
-        print("Name:", name)  # Debug print
-        print("Lines:", lines)  # Debug print
-        print("Covered areas:", covered_areas)  # Debug print
-        print("Age groups:", age_groups)  # Debug print
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Updating bus stop info:")
+            logger.debug("Name: %s", name)
+            logger.debug("Lines: %s", lines)
+            logger.debug("Covered areas: %s", covered_areas)
+            logger.debug("Age groups: %s", age_groups)
         
         # Format lines with bullet points and colors
         formatted_lines = []
@@ -249,6 +252,86 @@ def update_bus_stop_info(station_info):
         sys.stdout.flush()
         return "Error displaying station info", "Please try selecting another station"
 
+def build_map_figure(selected_year, radius, active_layers, age_group):
+    """
+    Build the map figure with every active layer, at the default view.
+    
+    Returns the figure and the index of its (empty) affected areas trace.
+    """
+    fig = map_layers.create_base_map()
+    
+    # Load data that might be needed by multiple layers
+    cityline_data = data_loader.load_cityline_data(selected_year or '2025')
+    small_areas = None
+    if 'smasvaedi' in (active_layers or []) or 'density' in (active_layers or []):
+        small_areas = data_loader.load_small_areas()
+    
+    # Add layers in specific order for proper visibility
+    
+    # 1. Add base layers first
+    if active_layers and 'smasvaedi' in active_layers:
+        fig = map_layers.add_small_areas_layer(fig, small_areas)
+    
+    if active_layers and 'density' in active_layers:
+        total_pop = get_zone_population(age_group)
+        small_areas = small_areas.copy()
+        small_areas.index = small_areas.index.astype(str)
+        small_areas['fjoldi'] = small_areas.index.map(total_pop).fillna(0).astype('int32')
+        fig = map_layers.add_small_areas_layer(fig, small_areas, show_population=True)
+    
+    # 2. Add coverage circles if enabled
+    if active_layers and 'coverage' in active_layers and radius:
+        fig = map_layers.add_radius_circles(fig, cityline_data.geometry, radius, cityline_data['line'])
+    
+    # 3. Reserve the affected areas trace; its index is returned so the
+    # selected station's areas can be patched in without a rebuild
+    affected_idx = len(fig.data)
+    fig.add_trace(map_layers.create_affected_areas_trace(None))
+    
+    # 4. Add cityline and stations on top
+    if not active_layers or 'cityline' in active_layers:  # Show cityline by default if no layers selected
+        fig = map_layers.add_cityline_layer(fig, cityline_data, None, selected_year)
+    
+    # 5. Add schools if enabled
+    if active_layers and 'schools' in active_layers:
+        schools_data = data_loader.load_schools_data()
+        fig = map_layers.add_schools_layer(fig, schools_data)
+        
+    # 6. Add stræto layer if enabled
+    if active_layers and 'straeto' in active_layers:
+        from src.layers.straeto_layer import add_straeto_layer
+        fig = add_straeto_layer(fig)
+    
+    # Preserve interactive state
+    fig.update_layout(uirevision=True)
+    
+    return fig, affected_idx
+
+def get_map_figure(selected_year, radius, active_layers, age_group):
+    """Get the figure dict and affected areas trace index for the map controls, building them on a cache miss"""
+    key = (selected_year, radius, tuple(sorted(active_layers or [])), age_group)
+    cached = _figure_cache.get(key)
+    if cached is None:
+        fig, affected_idx = build_map_figure(selected_year, radius, active_layers, age_group)
+        cached = (fig.to_dict(), affected_idx)
+        _figure_cache[key] = cached
+        if len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    else:
+        _figure_cache.move_to_end(key)
+    return cached
+
+def get_affected_areas_trace(selected_station, affected_areas_json):
+    """Affected areas trace dict for the selected station, empty when none is selected"""
+    return map_layers.create_affected_areas_trace(affected_areas_json if selected_station else None).to_plotly_json()
+
+def find_affected_areas_index(figure):
+    """Index of the affected areas trace in a figure dict, or None when it has none"""
+    for i, trace in enumerate((figure or {}).get('data', [])):
+        if trace.get('uid') == AFFECTED_AREAS_UID:
+            return i
+    return None
+
 @app.callback(
     Output('map-container', 'figure'),
     [Input('year-selector', 'value'),
@@ -261,74 +344,35 @@ def update_bus_stop_info(station_info):
 )
 def update_map(selected_year, radius, active_layers, selected_station, affected_areas_json, age_group, current_figure):
     try:
-        # Create base map while preserving the current view state
-        fig = map_layers.create_base_map()
+        # When only the selection changed, patch just the affected areas trace
+        # of the figure on screen instead of sending the whole figure back
+        triggered = {t['prop_id'].split('.')[0] for t in callback_context.triggered}
+        if triggered and triggered <= {'selected-station-store', 'affected-areas-store'}:
+            affected_idx = find_affected_areas_index(current_figure)
+            if affected_idx is not None:
+                patch = Patch()
+                patch['data'][affected_idx] = get_affected_areas_trace(selected_station, affected_areas_json)
+                return patch
+        
+        # Reuse the figure dict built for the same controls, filling the
+        # current selection into a copy of its trace list
+        figure, affected_idx = get_map_figure(selected_year, radius, active_layers, age_group)
+        data = list(figure['data'])
+        data[affected_idx] = get_affected_areas_trace(selected_station, affected_areas_json)
+        layout = figure['layout']
         
-        # Preserve the current view state if it exists
+        # Preserve the current view state if it exists, without touching the cached dict
         if current_figure and 'layout' in current_figure and 'mapbox' in current_figure['layout']:
             current_mapbox = current_figure['layout']['mapbox']
             if 'center' in current_mapbox:
-                fig.update_layout(
-                    mapbox=dict(
-                        center=current_mapbox['center'],
-                        zoom=current_mapbox.get('zoom', map_layers.default_zoom)
-                    )
+                mapbox = dict(
+                    layout['mapbox'],
+                    center=current_mapbox['center'],
+                    zoom=current_mapbox.get('zoom', map_layers.default_zoom)
                 )
+                layout = dict(layout, mapbox=mapbox)
         
-        # Load data that might be needed by multiple layers
-        cityline_data = data_loader.load_cityline_data(selected_year or '2025')
-        small_areas = None
-        if 'smasvaedi' in (active_layers or []) or 'density' in (active_layers or []):
-            small_areas = data_loader.load_small_areas()
-        
-        # Add layers in specific order for proper visibility
-        
-        # 1. Add base layers first
-        if active_layers and 'smasvaedi' in active_layers:
-            fig = map_layers.add_small_areas_layer(fig, small_areas)
-        
-        if active_layers and 'density' in active_layers:
-            population_data = data_loader.load_population_data()
-            if age_group:
-                age_range = f"{age_group} ára"
-                population_data = population_data[population_data['aldursflokkur'] == age_range]
-            population_data['smasvaedi'] = population_data['smasvaedi'].astype(str).str.zfill(4)
-            total_pop = population_data.groupby('smasvaedi')['fjoldi'].sum()
-            small_areas = small_areas.copy()
-            small_areas.index = small_areas.index.astype(str)
-            small_areas['fjoldi'] = 0
-            for area_id, pop in total_pop.items():
-                if area_id in small_areas.index:
-                    small_areas.at[area_id, 'fjoldi'] = pop
-            fig = map_layers.add_small_areas_layer(fig, small_areas, show_population=True)
-        
-        # 2. Add coverage circles if enabled
-        if active_layers and 'coverage' in active_layers and radius:
-            for _, station in cityline_data.iterrows():
-                fig = map_layers.add_radius_circle(fig, station.geometry, radius, station['line'])
-        
-        # 3. Add affected areas if a station is selected
-        if selected_station and affected_areas_json:
-            fig = map_layers.add_affected_areas_layer(fig, affected_areas_json)
-        
-        # 4. Add cityline and stations on top
-        if not active_layers or 'cityline' in active_layers:  # Show cityline by default if no layers selected
-            fig = map_layers.add_cityline_layer(fig, cityline_data, None, selected_year)
-        
-        # 5. Add schools if enabled
-        if active_layers and 'schools' in active_layers:
-            schools_data = data_loader.load_schools_data()
-            fig = map_layers.add_schools_layer(fig, schools_data)
-            
-        # 6. Add stræto layer if enabled
-        if active_layers and 'straeto' in active_layers:
-            from src.layers.straeto_layer import add_straeto_layer
-            fig = add_straeto_layer(fig)
-        
-        # Preserve interactive state
-        fig.update_layout(uirevision=True)
-        
-        return fig
+        return dict(figure, data=data, layout=layout)
     except Exception as e:
         print("ERROR UPDATING MAP:", str(e))
         import traceback
@@ -337,9 +381,14 @@ def update_map(selected_year, radius, active_layers, selected_station, affected_
         return map_layers.create_base_map()
 
 if __name__ == '__main__':
+    # Show this module's debug output in the terminal while running the dev server
+    logging.basicConfig(format='%(message)s')
+    logger.setLevel(logging.DEBUG)
+    
     print("\nStarting Borgarlínan Visualization...")
     print("Access the application at http://localhost:8050")
     print("\nIMPORTANT: When you click a station, debug information will appear here in this terminal.")
     print("\nInitializing application...")
     sys.stdout.flush()
-    app.run_server(debug=True, port=8050)
+    # The reloader and dev tools are only wanted while developing (DASH_ENV=dev)
+    app.run_server(debug=os.getenv('DASH_ENV') == 'dev', port=8050)
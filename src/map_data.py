@@ -0,0 +1,140 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+import shapely
+from pyproj import Transformer
+
+# Build the ISN93 -> WGS84 transformer once and reuse it for every map
+ISN93_TO_WGS84 = Transformer.from_crs(3057, 4326, always_xy=True)
+
+# Reprojected copies of the zone GeoJSON files are kept here between runs
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache')
+
+def _isn93_to_wgs84_coords(coords):
+    """Transform an (N, 2) array of ISN93 coordinates to WGS84 in one PROJ call"""
+    lon, lat = ISN93_TO_WGS84.transform(coords[:, 0], coords[:, 1])
+    return np.column_stack([lon, lat])
+
+def to_wgs84(gdf):
+    """
+    Reproject a GeoDataFrame with ISN93 (EPSG:3057) coordinates to WGS84.
+
+    The frame's own crs label is ignored, since files like capital.json carry
+    no crs member and come back labelled as WGS84 although they are ISN93.
+    """
+    geometry = shapely.transform(gdf.geometry.to_numpy(), _isn93_to_wgs84_coords)
+    return gdf.set_geometry(geometry, crs='EPSG:4326')
+
+def load_zones(geojson_path, columns):
+    """
+    Read a zone GeoJSON file as a WGS84 GeoDataFrame with the given columns.
+
+    The first read parses the JSON with pyogrio, reprojects it and writes a
+    Parquet copy to data/cache; later reads use that copy until the JSON
+    file is modified again.
+    """
+    name = os.path.splitext(os.path.basename(geojson_path))[0]
+    cache_path = os.path.join(CACHE_DIR, f'{name}.parquet')
+    
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(geojson_path):
+        gdf = to_wgs84(pyogrio.read_dataframe(geojson_path, use_arrow=True))
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        
+        # Write to a temporary file first so a process reading the cache
+        # concurrently never sees a half-written Parquet file
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    
+    return gpd.read_parquet(cache_path, columns=[*columns, 'geometry'])
+
+def load_table(csv_path, columns, dtype=None):
+    """
+    Read the given columns of a CSV file, optionally cast to the given dtypes.
+
+    Like load_zones, the first read parses the whole CSV with pyarrow and
+    writes a Parquet copy to data/cache; later reads take just the columns
+    they need from that copy until the CSV file is modified again.
+    """
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    cache_path = os.path.join(CACHE_DIR, f'{name}.parquet')
+    
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(csv_path):
+        df = pd.read_csv(csv_path, engine='pyarrow')
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    
+    df = pd.read_parquet(cache_path, columns=columns)
+    return df.astype(dtype) if dtype else df
+
+def extract_zone_codes(labels):
+    """
+    Extract the numeric zone code from the end of each zone label.
+
+    '... - 0101' becomes 101 as a nullable Int32, so it joins directly against
+    the integer smasvaedi column; labels without a numeric suffix give <NA>.
+    Runs as one vectorized pass over the column.
+    """
+    codes = pd.to_numeric(labels.str.rsplit('-', n=1).str[-1].str.strip(), errors='coerce')
+    return codes.astype('Int32')
+
+def match_popular_stops(stop_names, popular_names):
+    """
+    Match stop names against the popular stop names, best ranked first.
+
+    A stop matches a popular name when either is a prefix of the other. Every
+    pair is compared in one broadcast pass; returns a boolean array of which
+    stops matched and, for each stop, the index of its first matching name
+    (0 for stops without a match, or when there are no popular names).
+    """
+    stop_names = np.asarray(stop_names, dtype=str)[:, None]
+    popular_names = np.asarray(popular_names, dtype=str)
+    if len(popular_names) == 0:
+        return np.zeros(len(stop_names), dtype=bool), np.zeros(len(stop_names), dtype=int)
+    
+    matches = (np.char.startswith(stop_names, popular_names) |
+               np.char.startswith(popular_names, stop_names))
+    return matches.any(axis=1), matches.argmax(axis=1)
+
+def simplify_for_zoom(gdf, zoom):
+    """
+    Simplify WGS84 geometries with a tolerance that stays invisible at a zoom level.
+
+    The tolerance is a quarter of a web-map pixel at that zoom, so the outlines
+    still look exact two zoom levels further in.
+    """
+    tolerance = 360 / (256 * 2 ** (zoom + 2))
+    return gdf.set_geometry(gdf.geometry.simplify(tolerance, preserve_topology=True))
+
+def to_feature_collection(gdf):
+    """
+    Build the GeoJSON FeatureCollection dict for a GeoDataFrame.
+
+    folium uses a dict as-is, so this skips the encode/decode round trip of
+    handing it gdf.to_json(). Missing values become None, which serializes to null.
+    """
+    return {'type': 'FeatureCollection', 'features': list(gdf.iterfeatures(na='null'))}
+
+def colormap_fill(colormap, values, missing='#CCCCCC'):
+    """
+    Look up a branca LinearColormap colour for every value in one numpy pass.
+
+    Gives the same '#RRGGBBAA' strings as calling colormap(value) per value,
+    with missing values filled by the given colour.
+    """
+    x = np.asarray(values, dtype=float)
+    is_missing = np.isnan(x)
+    x = np.where(is_missing, colormap.vmin, x)
+    stops = np.asarray(colormap.colors)
+    channels = [np.interp(x, colormap.index, stops[:, j]) for j in range(4)]
+    rgba = (np.column_stack(channels) * 255.9999).astype(np.uint32)
+    packed = (rgba[:, 0] << 24) | (rgba[:, 1] << 16) | (rgba[:, 2] << 8) | rgba[:, 3]
+    fill = np.char.mod('#%08x', packed).astype(object)
+    fill[is_missing] = missing
+    return fill
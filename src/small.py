@@ -1,25 +1,34 @@
-import geopandas as gpd
 import folium
 from folium import GeoJson
-import json
 import os
+import numpy as np
+from map_data import ISN93_TO_WGS84, load_zones, simplify_for_zoom, to_feature_collection
+
+# Simplified zones and map center per GeoJSON file, reused by later maps in the same run
+_ZONE_CACHE = {}
 
 def create_zone_map():
     # Read the GeoJSON file from the correct path
     geojson_path = '../data/smasvaedi_2021.json'
+    zoom_start = 13
     
-    # Create a GeoDataFrame from the GeoJSON file
-    gdf = gpd.read_file(geojson_path)
-    
-    # Convert from ISN93 to WGS84 (EPSG:4326) which is required for web mapping
-    gdf = gdf.set_crs(epsg=3057, allow_override=True)  # Set the original CRS (ISN93)
-    gdf = gdf.to_crs(epsg=4326)  # Convert to WGS84
+    if geojson_path not in _ZONE_CACHE:
+        # Read the zones in WGS84 (EPSG:4326), which is required for web mapping,
+        # reading only the fields shown in the tooltip
+        gdf = load_zones(geojson_path, columns=['smsv_label', 'tlsv_label', 'smsv'])
+        
+        # Drop vertices too close together to see at the starting zoom
+        gdf = simplify_for_zoom(gdf, zoom_start)
+        
+        # Get the center of the data for map initialization
+        bounds = gdf.total_bounds
+        center = [(bounds[1] + bounds[3])/2, (bounds[0] + bounds[2])/2]
+        _ZONE_CACHE[geojson_path] = (gdf, center)
     
-    # Get the center of the data for map initialization
-    center = [gdf.geometry.centroid.y.mean(), gdf.geometry.centroid.x.mean()]
+    gdf, center = _ZONE_CACHE[geojson_path]
     
     # Create a base map centered on the data
-    m = folium.Map(location=center, zoom_start=13)
+    m = folium.Map(location=center, zoom_start=zoom_start)
     
     # Style function for the zones
     def style_function(feature):
@@ -32,7 +41,7 @@ def create_zone_map():
     
     # Add the zones to the map with tooltips
     GeoJson(
-        gdf.to_json(),
+        to_feature_collection(gdf),
         name='Zones',
         style_function=style_function,
         tooltip=folium.GeoJsonTooltip(
@@ -61,24 +70,19 @@ def add_points_to_map(map_object, points_data):
         ...
     ]
     """
-    # Create a temporary GeoDataFrame to convert point coordinates
     if points_data:
-        points_gdf = gpd.GeoDataFrame(
-            points_data,
-            geometry=gpd.points_from_xy([p['location'][1] for p in points_data], 
-                                      [p['location'][0] for p in points_data]),
-            crs='EPSG:3057'
-        )
-        # Convert to WGS84
-        points_gdf = points_gdf.to_crs('EPSG:4326')
+        # Convert all point coordinates to WGS84 in one PROJ call
+        xs = np.fromiter((p['location'][1] for p in points_data), float, len(points_data))
+        ys = np.fromiter((p['location'][0] for p in points_data), float, len(points_data))
+        lons, lats = ISN93_TO_WGS84.transform(xs, ys)
         
         # Add points to map
-        for idx, point in points_gdf.iterrows():
+        for point, lon, lat in zip(points_data, lons.tolist(), lats.tolist()):
             folium.CircleMarker(
-                location=[point.geometry.y, point.geometry.x],
+                location=[lat, lon],
                 radius=8,
-                popup=points_data[idx]['popup'],
-                tooltip=points_data[idx]['tooltip'],
+                popup=point['popup'],
+                tooltip=point['tooltip'],
                 color='red',
                 fill=True,
                 fill_color='red'
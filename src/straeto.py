@@ -3,50 +3,113 @@ import folium
 from folium import plugins
 import json
 import os
+from functools import lru_cache
 import numpy as np
+import shapely
+from branca.element import MacroElement
+from jinja2 import Template
+from map_data import load_table, match_popular_stops
+
+class BusStopLegend(MacroElement):
+    """Fixed legend explaining the popular and regular bus stop markers"""
+    _template = Template("""
+        {% macro html(this, kwargs) %}
+        <div style="position: fixed; 
+                    bottom: 50px; left: 50px; width: 180px;
+                    border:2px solid grey; z-index:9999; font-size:14px;
+                    background-color:white;
+                    padding: 10px;
+                    opacity: 0.8;">
+            <p><strong>Bus Stops</strong></p>
+            <p>
+                <svg height="20" width="20">
+                    <circle cx="10" cy="10" r="7" stroke="black" stroke-width="2" fill="#2d6a3e"/>
+                </svg>
+                Popular Stops<br>
+                (size indicates rank)
+            </p>
+            <p>
+                <svg height="20" width="20">
+                    <circle cx="10" cy="10" r="5" stroke="black" stroke-width="2" fill="white"/>
+                </svg>
+                Regular Stops
+            </p>
+        </div>
+        {% endmacro %}
+    """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'BusStopLegend'
 
 def generate_viridis_greens(n):
     """Generate n different shades of green inspired by viridis colormap"""
     if n <= 0:
         return []
-    greens = []
-    for i in range(n):
-        # Create a range of greens from darker (32,89,48) to lighter (119,209,152)
-        ratio = i / (n - 1) if n > 1 else 0
-        r = int(32 + (119 - 32) * ratio)
-        g = int(89 + (209 - 89) * ratio)
-        b = int(48 + (152 - 48) * ratio)
-        hex_color = f"#{r:02x}{g:02x}{b:02x}"
-        greens.append(hex_color)
-    return greens
+    # Create a range of greens from darker (32,89,48) to lighter (119,209,152)
+    ratios = np.arange(n) / (n - 1) if n > 1 else np.zeros(1)
+    start = np.array([32, 89, 48])
+    end = np.array([119, 209, 152])
+    rgb = (start + (end - start) * ratios[:, None]).astype(np.uint32)
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    return np.char.mod('#%06x', packed).tolist()
+
+# Douglas-Peucker tolerance for the route shapes in degrees, about a meter
+SHAPE_TOLERANCE = 1e-5
+
+# GTFS files read by load_bus_data
+BUS_FILES = ('data/raw/bus/stops.txt', 'data/raw/bus/routes.txt', 'data/raw/bus/shapes.txt')
+
+@lru_cache(maxsize=1)
+def _read_bus_data(mtimes):
+    """Read and process the GTFS files through the Parquet cache; cached on their modification times so edits are picked up"""
+    stops_path, routes_path, shapes_path = BUS_FILES
+    
+    # Read stops data, only the columns used
+    stops_df = load_table(stops_path, ['stop_id', 'stop_name', 'stop_lat', 'stop_lon'])
+    
+    # Read routes data
+    routes_df = load_table(routes_path, ['route_id', 'route_short_name', 'route_long_name'])
+    
+    # Read shapes data, the largest file; the coordinates stay float64 since
+    # they are written into the map as they are
+    shapes_df = load_table(
+        shapes_path,
+        ['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'],
+        dtype={'shape_id': 'int32', 'shape_pt_sequence': 'int32'}
+    )
+    
+    # Clean and process stops data
+    stops_df = stops_df.dropna(subset=['stop_lat', 'stop_lon'])
+    
+    # Routes without a long name get an empty one for their popups
+    routes_df['route_long_name'] = routes_df['route_long_name'].fillna('')
+    
+    # Process shapes data
+    shapes_df = shapes_df.sort_values(['shape_id', 'shape_pt_sequence'])
+    
+    return stops_df, routes_df, shapes_df
 
 def load_bus_data():
-    """Load and process bus stops, routes, and shapes data"""
+    """Load and process bus stops, routes, and shapes data, reusing the last read while the files are unchanged"""
     try:
-        # Read stops data
-        stops_df = pd.read_csv('data/raw/bus/stops.txt')
-        
-        # Read routes data
-        routes_df = pd.read_csv('data/raw/bus/routes.txt')
-        
-        # Read shapes data
-        shapes_df = pd.read_csv('data/raw/bus/shapes.txt')
-        
-        # Clean and process stops data
-        stops_df = stops_df[['stop_id', 'stop_name', 'stop_lat', 'stop_lon']]
-        stops_df = stops_df.dropna(subset=['stop_lat', 'stop_lon'])
-        
-        # Process routes data
-        routes_df = routes_df[['route_id', 'route_short_name', 'route_long_name']]
-        
-        # Process shapes data
-        shapes_df = shapes_df.sort_values(['shape_id', 'shape_pt_sequence'])
-        
-        return stops_df, routes_df, shapes_df
+        return _read_bus_data(tuple(os.path.getmtime(path) for path in BUS_FILES))
     except Exception as e:
         print(f"Error loading bus data: {e}")
         return None, None, None
 
+# Passenger flow and rank of the 20 most used stops
+POPULAR_STOPS_FILE = 'data/processed/20.csv'
+
+@lru_cache(maxsize=1)
+def _read_popular_stops(mtime):
+    """Read the popular stops best ranked first; cached on the file's modification time"""
+    return pd.read_csv(POPULAR_STOPS_FILE).sort_values('Popularity rating', kind='stable')
+
+def load_popular_stops():
+    """Load the popular stops, reusing the last read while the file is unchanged"""
+    return _read_popular_stops(os.path.getmtime(POPULAR_STOPS_FILE))
+
 def add_bus_stops(map_obj, stops_df):
     """Add bus stops to the map with special highlighting for popular stops"""
     if map_obj is None or stops_df is None:
@@ -57,56 +120,73 @@ def add_bus_stops(map_obj, stops_df):
         # Create a feature group for bus stops
         stops_group = folium.FeatureGroup(name='Bus Stops')
         
-        # Read popular stops data
+        # Read popular stops data, best ranked first
         try:
-            popular_stops_df = pd.read_csv('data/processed/20.csv')
-            popular_stop_names = set(popular_stops_df['stop_name'])
-            flow_dict = dict(zip(popular_stops_df['stop_name'], 
-                               popular_stops_df['Passenger flow in 2023']))
-            rank_dict = dict(zip(popular_stops_df['stop_name'], 
-                               popular_stops_df['Popularity rating']))
+            popular_stops_df = load_popular_stops()
         except Exception as e:
             print(f"Warning: Could not load popular stops data. Error: {e}")
-            popular_stop_names = set()
-            flow_dict = {}
-            rank_dict = {}
+            popular_stops_df = pd.DataFrame(columns=['stop_name', 'Passenger flow in 2023', 'Popularity rating'])
         
-        # Add each stop as a circle marker
-        for _, stop in stops_df.iterrows():
-            stop_name = stop['stop_name']
-            
-            # Check if this stop is popular
-            is_popular = any(stop_name.startswith(pop_name) or pop_name.startswith(stop_name) 
-                            for pop_name in popular_stop_names)
-            
-            if is_popular:
-                matching_name = next(pop_name for pop_name in popular_stop_names 
-                                   if stop_name.startswith(pop_name) or pop_name.startswith(stop_name))
-                rank = rank_dict[matching_name]
-                radius = 20 - ((rank - 1) * 0.25)
-                color = 'black'
-                fill_color = '#2d6a3e'  # Medium green from our palette
-                weight = 2
-                popup_text = (
-                    f"<b>{stop_name}</b><br>"
-                    f"Daily Passengers: {flow_dict[matching_name]:,}<br>"
-                    f"Rank: #{rank}"
+        # Match every stop against the popular names; the index picks the highest ranked match
+        is_popular, matching_idx = match_popular_stops(
+            stops_df['stop_name'].to_numpy(dtype=str),
+            popular_stops_df['stop_name'].to_numpy(dtype=str)
+        )
+        ranks = popular_stops_df['Popularity rating'].to_numpy()
+        flows = popular_stops_df['Passenger flow in 2023'].to_numpy()
+        
+        # Add all regular stops as one GeoJSON layer of circle markers, so the
+        # page gets one feature collection instead of a marker call per stop
+        regular_stops = stops_df[~is_popular]
+        regular_features = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                    'properties': {'stop_name': name}
+                }
+                for name, lat, lon in zip(
+                    regular_stops['stop_name'].tolist(),
+                    regular_stops['stop_lat'].tolist(),
+                    regular_stops['stop_lon'].tolist()
                 )
-            else:
-                radius = 6
-                color = 'black'
-                fill_color = 'white'
-                weight = 2
-                popup_text = f"{stop_name}"
-            
+            ]
+        }
+        folium.GeoJson(
+            regular_features,
+            name='Regular Stops',
+            marker=folium.CircleMarker(
+                radius=6,
+                color='black',
+                fill=True,
+                fillColor='white',
+                fillOpacity=0.6,
+                weight=2
+            ),
+            popup=folium.GeoJsonPopup(fields=['stop_name'], labels=False)
+        ).add_to(stops_group)
+        
+        # Add the popular stops on top as individual markers with their own popups;
+        # the flow and rank lines are formatted once per popular name, not per stop
+        popular_stops = stops_df[is_popular]
+        popular_matches = matching_idx[is_popular]
+        popular_info = np.array([
+            f"<br>Daily Passengers: {flow:,}<br>Rank: #{rank}"
+            for flow, rank in zip(flows, ranks)
+        ], dtype=object)
+        popup_texts = ('<b>' + popular_stops['stop_name'].to_numpy(dtype=object) + '</b>' + popular_info[popular_matches]).tolist()
+        radii = 20 - ((ranks[popular_matches] - 1) * 0.25)
+        
+        for stop, radius, popup_text in zip(popular_stops.itertuples(index=False), radii, popup_texts):
             folium.CircleMarker(
-                location=[stop['stop_lat'], stop['stop_lon']],
+                location=[stop.stop_lat, stop.stop_lon],
                 radius=radius,
-                color=color,
+                color='black',
                 fill=True,
-                fillColor=fill_color,
+                fillColor='#2d6a3e',  # Medium green from our palette
                 fillOpacity=0.6,
-                weight=weight,
+                weight=2,
                 popup=folium.Popup(popup_text, parse_html=True)
             ).add_to(stops_group)
         
@@ -114,30 +194,7 @@ def add_bus_stops(map_obj, stops_df):
         stops_group.add_to(map_obj)
         
         # Add legend
-        legend_html = """
-        <div style="position: fixed; 
-                    bottom: 50px; left: 50px; width: 180px;
-                    border:2px solid grey; z-index:9999; font-size:14px;
-                    background-color:white;
-                    padding: 10px;
-                    opacity: 0.8;">
-            <p><strong>Bus Stops</strong></p>
-            <p>
-                <svg height="20" width="20">
-                    <circle cx="10" cy="10" r="7" stroke="black" stroke-width="2" fill="#2d6a3e"/>
-                </svg>
-                Popular Stops<br>
-                (size indicates rank)
-            </p>
-            <p>
-                <svg height="20" width="20">
-                    <circle cx="10" cy="10" r="5" stroke="black" stroke-width="2" fill="white"/>
-                </svg>
-                Regular Stops
-            </p>
-        </div>
-        """
-        map_obj.get_root().html.add_child(folium.Element(legend_html))
+        BusStopLegend().add_to(map_obj)
         
         return map_obj
     except Exception as e:
@@ -159,34 +216,55 @@ def add_bus_routes(map_obj, routes_df, shapes_df):
         route_colors = generate_viridis_greens(len(unique_routes))
         color_mapping = dict(zip(unique_routes, route_colors))
         
+        # Look routes up by their id as a string, keeping the first route per id
+        route_by_id = {}
+        for route in routes_df.itertuples(index=False):
+            route_by_id.setdefault(str(route.route_id), route)
+        
+        # The shapes are sorted by shape_id, so each shape is one contiguous run
+        # of rows; find where every run starts instead of grouping in pandas
+        shape_ids = shapes_df['shape_id'].to_numpy()
+        coords = shapes_df[['shape_pt_lat', 'shape_pt_lon']].to_numpy()
+        unique_ids, starts = np.unique(shape_ids, return_index=True)
+        ends = np.append(starts[1:], len(shape_ids))
+        
+        # Drop the shape points that lie within about a meter of the simplified
+        # line, simplifying every shape in one call. A line needs two points,
+        # so shorter shapes are left out here and drawn from their rows as they are
+        lengths = ends - starts
+        is_line = lengths >= 2
+        lines = np.full(len(unique_ids), None, dtype=object)
+        line_rows = np.repeat(is_line, lengths)
+        lines[is_line] = shapely.simplify(
+            shapely.linestrings(coords[line_rows], indices=np.repeat(np.arange(is_line.sum()), lengths[is_line])),
+            SHAPE_TOLERANCE,
+            preserve_topology=False
+        )
+        
         # Process each shape
-        for shape_id, shape_points in shapes_df.groupby('shape_id'):
+        for shape_id, line, start, end in zip(unique_ids, lines, starts, ends):
             try:
-                # Extract potential route number from shape_id
+                # Extract potential route number from shape_id and take the
+                # first one that names a route
                 str_shape_id = str(shape_id)
                 potential_route_ids = [
                     str_shape_id[:1],
                     str_shape_id[:2],
                     str_shape_id[:3]
                 ]
+                route = next((route_by_id[pot_id] for pot_id in potential_route_ids if pot_id in route_by_id), None)
+                if route is None:
+                    continue
+                
+                route_color = color_mapping.get(route.route_id, '#2d6a3e')  # Default to medium green if no color found
                 
-                # Find matching route
-                for pot_id in potential_route_ids:
-                    matching_routes = routes_df[routes_df['route_id'].astype(str) == pot_id]
-                    if not matching_routes.empty:
-                        route = matching_routes.iloc[0]
-                        route_color = color_mapping.get(route['route_id'], '#2d6a3e')  # Default to medium green if no color found
-                        
-                        coordinates = shape_points[['shape_pt_lat', 'shape_pt_lon']].values.tolist()
-                        
-                        folium.PolyLine(
-                            locations=coordinates,
-                            weight=2,
-                            color=route_color,
-                            opacity=0.7,
-                            popup=f"Route {route['route_short_name']}: {route['route_long_name']}"
-                        ).add_to(routes_group)
-                        break
+                folium.PolyLine(
+                    locations=coords[start:end].tolist() if line is None else shapely.get_coordinates(line).tolist(),
+                    weight=2,
+                    color=route_color,
+                    opacity=0.7,
+                    popup=f"Route {route.route_short_name}: {route.route_long_name}"
+                ).add_to(routes_group)
             
             except Exception as e:
                 print(f"Error processing shape {shape_id}: {e}")
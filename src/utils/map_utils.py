@@ -4,6 +4,7 @@ import plotly.graph_objects as go
 import pandas as pd
 import geopandas as gpd
 import json
+from functools import lru_cache
 
 def create_map_layout(app):
     """Create the main layout with map and right-side controls"""
@@ -47,6 +48,8 @@ def create_map_layout(app):
                             800: '800m',
                             1000: '1000m'
                         },
+                        # Only report the value on release so a drag triggers one map rebuild
+                        updatemode='mouseup',
                         tooltip={'placement': 'bottom', 'always_visible': True}
                     )
                 ], style={'padding': '20px', 'borderBottom': '1px solid #ddd'}),
@@ -126,40 +129,30 @@ def update_map_data(fig, geojson_data, data_values, locations):
     )
     return fig
 
-def create_age_distribution_chart(age_data):
-    """Create age distribution bar chart"""
+@lru_cache(maxsize=64)
+def _bar_chart(labels, values, color, xaxis_title):
+    """Build a bar chart figure dict once per set of bars, for the chart builders to copy"""
     fig = go.Figure(data=[
         go.Bar(
-            x=list(age_data.keys()),
-            y=list(age_data.values()),
-            marker_color='#1f77b4'
+            x=list(labels),
+            y=list(values),
+            marker_color=color
         )
     ])
     
     fig.update_layout(
         margin=dict(l=20, r=20, t=20, b=40),
         height=200,
-        xaxis_title="Age Groups",
+        xaxis_title=xaxis_title,
         yaxis_title="Count"
     )
     
-    return fig
+    return fig.to_dict()
+
+def create_age_distribution_chart(age_data):
+    """Create age distribution bar chart, copied from the cached build for identical data"""
+    return go.Figure(_bar_chart(tuple(age_data.keys()), tuple(age_data.values()), '#1f77b4', "Age Groups"))
 
 def create_income_distribution_chart(income_data):
-    """Create income distribution bar chart"""
-    fig = go.Figure(data=[
-        go.Bar(
-            x=list(income_data.keys()),
-            y=list(income_data.values()),
-            marker_color='#2ca02c'
-        )
-    ])
-    
-    fig.update_layout(
-        margin=dict(l=20, r=20, t=20, b=40),
-        height=200,
-        xaxis_title="Income Brackets",
-        yaxis_title="Count"
-    )
-    
-    return fig
+    """Create income distribution bar chart, copied from the cached build for identical data"""
+    return go.Figure(_bar_chart(tuple(income_data.keys()), tuple(income_data.values()), '#2ca02c', "Income Brackets"))
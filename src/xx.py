@@ -1,59 +1,76 @@
-import json
+import numpy as np
+import orjson
+import os
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Point, LineString
 import folium
 
-# Read the JSON data
-with open('data/processed/cityline_2025_4326.geojson', 'r') as f:
-    data = json.load(f)
-
-# Create lists to store points for each line
-red_line_points = []
-blue_line_points = []
-
-# Sort features by line color and store coordinates
-for feature in data['features']:
-    coords = feature['geometry']['coordinates']
-    if feature['properties']['line'] == 'red':
-        red_line_points.append(coords)
-    else:
-        blue_line_points.append(coords)
-
-# Create a map centered on Reykjavik
-m = folium.Map(location=[64.13, -21.85], zoom_start=12)
-
-# Add red line
-red_line = LineString(red_line_points)
-folium.PolyLine(
-    locations=[[p[1], p[0]] for p in red_line_points],
-    color='red',
-    weight=3,
-    opacity=0.8
-).add_to(m)
-
-# Add blue line
-blue_line = LineString(blue_line_points)
-folium.PolyLine(
-    locations=[[p[1], p[0]] for p in blue_line_points],
-    color='blue',
-    weight=3,
-    opacity=0.8
-).add_to(m)
-
-# Add markers for stations
-for feature in data['features']:
-    coords = feature['geometry']['coordinates']
-    name = feature['properties']['name']
-    color = feature['properties']['line']
-    
-    folium.CircleMarker(
-        location=[coords[1], coords[0]],
-        radius=5,
-        color=color,
-        fill=True,
-        popup=name
+INPUT_PATH = 'data/processed/cityline_2025_4326.geojson'
+OUTPUT_PATH = 'reykjavik_bus_lines.html'
+
+def is_up_to_date(output_path, *input_paths):
+    """Check that output_path exists and is newer than every input file"""
+    if not os.path.exists(output_path):
+        return False
+    output_mtime = os.path.getmtime(output_path)
+    return all(os.path.getmtime(path) <= output_mtime for path in input_paths)
+
+def main():
+    # Rendering the map dominates the run, so skip it while the saved map is current
+    if is_up_to_date(OUTPUT_PATH, INPUT_PATH, __file__):
+        print(f"{OUTPUT_PATH} is up to date")
+        return
+
+    # Read the JSON data
+    with open(INPUT_PATH, 'rb') as f:
+        data = orjson.loads(f.read())
+
+    # Create lists to store points for each line
+    red_line_points = []
+    blue_line_points = []
+
+    # Swap every station's [lon, lat] to folium's [lat, lon] in one array operation
+    locations = np.asarray([feature['geometry']['coordinates'] for feature in data['features']])[:, [1, 0]].tolist()
+
+    # Sort the station points by line color
+    for feature, location in zip(data['features'], locations):
+        if feature['properties']['line'] == 'red':
+            red_line_points.append(location)
+        else:
+            blue_line_points.append(location)
+
+    # Create a map centered on Reykjavik
+    m = folium.Map(location=[64.13, -21.85], zoom_start=12)
+
+    # Add red line
+    folium.PolyLine(
+        locations=red_line_points,
+        color='red',
+        weight=3,
+        opacity=0.8
+    ).add_to(m)
+
+    # Add blue line
+    folium.PolyLine(
+        locations=blue_line_points,
+        color='blue',
+        weight=3,
+        opacity=0.8
     ).add_to(m)
 
-# Save the map
-m.save('reykjavik_bus_lines.html')
\ No newline at end of file
+    # Add every station marker as one layer on top of the lines
+    folium.GeoJson(
+        data,
+        marker=folium.CircleMarker(radius=5, fill=True),
+        style_function=lambda feature: {
+            'color': feature['properties']['line'],
+            'fillColor': feature['properties']['line']
+        },
+        popup=folium.GeoJsonPopup(fields=['name'], labels=False)
+    ).add_to(m)
+
+    # Save the map
+    m.save(OUTPUT_PATH)
+
+if __name__ == "__main__":
+    main()